@@ -0,0 +1,189 @@
+"""
+Knowledge base oluştururken tekrar eden ve birbirine çok benzeyen chunk'ları birleştirme
+- MinHash + LSH ile aday çiftler bulunur, kelime shingle'ları üzerinden kesin Jaccard/kapsama ile doğrulanır
+- Embedding'ler hazırsa cosine benzerliği ile ikinci bir birleştirme yapılabilir
+Birleştirilen chunk'ların sayfa numaraları `page_numbers` içinde korunur
+"""
+
+import re
+import zlib
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+_TOKEN = re.compile(r"\w+", re.UNICODE)
+_PRIME = (1 << 31) - 1
+
+
+def _shingles(text: str, size: int) -> set:
+    tokens = _TOKEN.findall(text.casefold())
+    if len(tokens) < size:
+        return {" ".join(tokens)} if tokens else set()
+    return {" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+def _minhash(shingles: set, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    return ((a[:, None] * hashes[None, :] + b[:, None]) % _PRIME).min(axis=1)
+
+
+class _UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, x: int) -> int:
+        while self.parent[x] != x:
+            self.parent[x] = self.parent[self.parent[x]]
+            x = self.parent[x]
+        return x
+
+    def union(self, x: int, y: int):
+        self.parent[self.find(x)] = self.find(y)
+
+
+def _merge_groups(chunks: List[Dict], uf: _UnionFind, sizes: List[int]) -> List[Dict]:
+    """Her gruptan en uzun chunk'ı tut, diğerlerinin sayfa numaralarını ona ekle"""
+    groups = defaultdict(list)
+    for idx in range(len(chunks)):
+        groups[uf.find(idx)].append(idx)
+
+    kept = []
+    for members in groups.values():
+        keep = max(members, key=lambda i: sizes[i])
+        merged = dict(chunks[keep])
+
+        pages = set()
+        for i in members:
+            chunk = chunks[i]
+            pages.update(chunk.get("page_numbers", []))
+            if chunk.get("page_number") is not None:
+                pages.add(chunk["page_number"])
+        if pages:
+            merged["page_numbers"] = sorted(pages)
+
+        kept.append((min(members), merged))
+
+    # Orijinal sırayı koru
+    kept.sort(key=lambda item: item[0])
+    return [chunk for _, chunk in kept]
+
+
+def dedupe_chunks(chunks: List[Dict], threshold: float = 0.8, containment: float = 0.9,
+                  shingle_size: int = 5, num_perm: int = 64, bands: int = 16,
+                  seed: int = 42) -> Tuple[List[Dict], Dict]:
+    """Metni neredeyse aynı olan chunk'ları birleştir
+
+    İki chunk, kelime shingle'larının Jaccard benzerliği `threshold` üstündeyse ya da
+    küçük olanın shingle'larının `containment` oranı büyük olanda varsa aynı kabul edilir.
+    """
+    n = len(chunks)
+    shingle_sets = [_shingles(c["text"], shingle_size) for c in chunks]
+
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, _PRIME, size=num_perm, dtype=np.uint64)
+    b = rng.integers(0, _PRIME, size=num_perm, dtype=np.uint64)
+    rows = num_perm // bands
+
+    # LSH: aynı bantta aynı imzaya sahip chunk'lar aday çift olur
+    candidates = set()
+    buckets = defaultdict(list)
+    for idx, shingles in enumerate(shingle_sets):
+        if not shingles:
+            continue
+        signature = _minhash(shingles, a, b)
+        for band in range(bands):
+            key = (band, signature[band * rows:(band + 1) * rows].tobytes())
+            buckets[key].append(idx)
+    for members in buckets.values():
+        for i in range(len(members)):
+            for j in range(i + 1, len(members)):
+                candidates.add((members[i], members[j]))
+
+    # Aynı sayfadaki örtüşen pencereler: küçük olan büyüğün içinde kalabilir (Jaccard düşük olur)
+    by_page = defaultdict(list)
+    for idx, chunk in enumerate(chunks):
+        if chunk.get("page_number") is not None:
+            by_page[chunk["page_number"]].append(idx)
+    for members in by_page.values():
+        for i in range(len(members)):
+            for j in range(i + 1, len(members)):
+                candidates.add((members[i], members[j]))
+
+    uf = _UnionFind(n)
+    exact = near = contained = 0
+    for i, j in candidates:
+        si, sj = shingle_sets[i], shingle_sets[j]
+        if not si or not sj:
+            continue
+        if si == sj:
+            exact += 1
+        else:
+            intersection = len(si & sj)
+            if intersection / len(si | sj) >= threshold:
+                near += 1
+            elif intersection / min(len(si), len(sj)) >= containment:
+                contained += 1
+            else:
+                continue
+        uf.union(i, j)
+
+    kept = _merge_groups(chunks, uf, [len(s) for s in shingle_sets])
+    stats = {
+        "before": n,
+        "after": len(kept),
+        "exact_pairs": exact,
+        "near_pairs": near,
+        "contained_pairs": contained,
+    }
+    return kept, stats
+
+
+def collapse_by_embedding(chunks: List[Dict], threshold: float = 0.97) -> Tuple[List[Dict], Dict]:
+    """Embedding'leri neredeyse aynı olan chunk'ları birleştir (chunk['embedding'] gerekli)"""
+    n = len(chunks)
+    if n < 2:
+        return list(chunks), {"before": n, "after": n, "embedding_pairs": 0}
+
+    matrix = np.asarray([c["embedding"] for c in chunks], dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    matrix = matrix / norms
+    similarities = matrix @ matrix.T
+
+    uf = _UnionFind(n)
+    pairs = 0
+    rows, cols = np.nonzero(np.triu(similarities >= threshold, k=1))
+    for i, j in zip(rows.tolist(), cols.tolist()):
+        uf.union(i, j)
+        pairs += 1
+
+    kept = _merge_groups(chunks, uf, [len(c["text"]) for c in chunks])
+    return kept, {"before": n, "after": len(kept), "embedding_pairs": pairs}
+
+
+def retrieval_overlap(before: List[Dict], after: List[Dict], top_k: int = 3) -> float:
+    """Dedupe öncesi ve sonrası top-k sonuçlarının ne kadar aynı sayfaları kapsadığı
+
+    Orijinal chunk'ların kendi embedding'leri sorgu olarak kullanılır; sonuç 1.0'a ne kadar
+    yakınsa birleştirme o kadar az bilgi kaybına yol açmıştır.
+    """
+    def normalize(chunks):
+        matrix = np.asarray([c["embedding"] for c in chunks], dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def pages(chunk):
+        return set(chunk.get("page_numbers", [])) | {chunk.get("page_number")}
+
+    before_matrix, after_matrix = normalize(before), normalize(after)
+    scores = []
+    for query in before_matrix:
+        top_before = np.argsort(-(before_matrix @ query))[:top_k]
+        top_after = np.argsort(-(after_matrix @ query))[:top_k]
+        expected = set().union(*(pages(before[i]) for i in top_before))
+        found = set().union(*(pages(after[i]) for i in top_after))
+        scores.append(len(expected & found) / len(expected) if expected else 1.0)
+
+    return float(np.mean(scores))
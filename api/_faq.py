@@ -0,0 +1,93 @@
+"""
+Önceden hesaplanmış SSS (FAQ) cevap tablosu
+scripts/build_faq.py tarafından üretilir; eşleşen sorular embedding veya LLM çağrısı yapılmadan cevaplanır
+"""
+
+import json
+import re
+from typing import Dict, List, Optional
+
+from _lexical import code_tokens
+
+_PUNCTUATION = re.compile(r"[^\w\s]", re.UNICODE)
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(text: str) -> str:
+    """Soruyu eşleştirme için normalize et (küçük harf, noktalama ve fazla boşluk yok)"""
+    # Türkçe 'İ' casefold ile 'i̇' olur; birleşik noktayı at
+    text = text.replace("İ", "i").casefold().replace("\u0307", "")
+    text = _PUNCTUATION.sub(" ", text)
+    return _WHITESPACE.sub(" ", text).strip()
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class FAQTable:
+    """Bilgi tabanı sürümüne bağlı SSS cevap tablosu"""
+
+    def __init__(self, data: Dict, min_similarity: float = 0.8, min_tokens: int = 3):
+        self.metadata = data.get("metadata", {})
+        self.kb_version = self.metadata.get("kb_version")
+        self.entries = data.get("entries", [])
+        self.min_similarity = min_similarity
+        self.min_tokens = min_tokens
+
+        # Normalize edilmiş varyant -> entry (birebir eşleşme O(1))
+        self._exact = {}
+        self._variants = []
+        for entry in self.entries:
+            for variant in entry.get("variants", []) + [entry["question"]]:
+                normalized = normalize_question(variant)
+                if not normalized:
+                    continue
+                self._exact.setdefault(normalized, entry)
+                self._variants.append((frozenset(normalized.split()), code_tokens(variant), entry))
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> Optional["FAQTable"]:
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                return cls(json.load(f), **kwargs)
+        except FileNotFoundError:
+            return None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, question: str) -> Optional[Dict]:
+        """Yüksek güvenle eşleşen SSS kaydını döndür, yoksa None
+
+        Benzerlik eşleşmesinde kod benzeri kelimeler (Z/X raporu, hata kodları) birebir aynı olmalıdır.
+        """
+        normalized = normalize_question(question)
+        entry = self._exact.get(normalized)
+        if entry is not None:
+            return entry
+
+        tokens = frozenset(normalized.split())
+        if len(tokens) < self.min_tokens:
+            return None
+
+        codes = code_tokens(question)
+        best_entry, best_score = None, 0.0
+        for variant_tokens, variant_codes, candidate in self._variants:
+            if variant_codes != codes:
+                continue
+            score = _jaccard(tokens, variant_tokens)
+            if score > best_score:
+                best_entry, best_score = candidate, score
+
+        return best_entry if best_score >= self.min_similarity else None
+
+
+def build_faq_data(entries: List[Dict], kb_version: str, **metadata) -> Dict:
+    """build_faq.py için dosya formatı"""
+    return {
+        "metadata": {"kb_version": kb_version, "total_entries": len(entries), **metadata},
+        "entries": entries
+    }
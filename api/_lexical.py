@@ -0,0 +1,178 @@
+"""
+BM25 inverted index ve reciprocal rank fusion (RRF)
+Menü adları, hata kodları, buton etiketleri gibi birebir kelimeler ("Z raporu", "FDM") embedding
+aramasında kaçabilir; lexical index bunları ağ çağrısı olmadan yerelde bulur
+"""
+
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Hashable, List, Tuple
+
+# Aksanları atarken korunmayan Türkçe harfler için ASCII karşılıkları
+_TURKISH_FOLD = str.maketrans({"ı": "i", "ş": "s", "ğ": "g", "ç": "c", "ö": "o", "ü": "u"})
+_TOKEN = re.compile(r"[\w']+", re.UNICODE)
+_APOSTROPHES = re.compile(r"[’`´]")
+
+# Fransızca kesme işaretli önekler (l'écran, d'un, qu'il ...)
+_FRENCH_ELISIONS = {"l", "d", "j", "m", "n", "s", "t", "c", "qu", "jusqu", "lorsqu", "puisqu"}
+
+# Aksan katlamadan sonraki hâlleriyle
+_STOPWORDS = {
+    # Türkçe
+    "ve", "veya", "ile", "bir", "bu", "su", "o", "da", "de", "mi", "mu", "ne", "nasil", "icin",
+    "gibi", "daha", "en", "ama", "ki", "olan", "olarak", "nedir", "neden", "hangi", "var", "yok",
+    # Fransızca
+    "le", "la", "les", "un", "une", "des", "du", "et", "ou", "au", "aux", "en", "pour", "par",
+    "sur", "dans", "avec", "est", "sont", "que", "qui", "ce", "cette", "comment", "pas",
+}
+
+STEM_PREFIX = 5
+
+# tokenize() davranışı değişince artırılır; eski sürümle kaydedilmiş index'ler yeniden oluşturulur
+TOKENIZER_VERSION = 3
+
+
+def _fold(text: str) -> str:
+    """Küçük harf + Türkçe/Fransızca aksan katlama (İ/I/ı/i hepsi 'i' olur)"""
+    text = text.replace("İ", "i").replace("I", "i").casefold().translate(_TURKISH_FOLD)
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def _has_digit(word: str) -> bool:
+    """Hata kodu, PLU numarası gibi kök alınmaması gereken kelime mi"""
+    return any(ch.isdigit() for ch in word)
+
+
+def _words(text: str):
+    """(orijinal, katlanmış) kelime çiftleri; kesme işaretli önek/ekler ve stopword'ler atılmış"""
+    text = unicodedata.normalize("NFC", _APOSTROPHES.sub("'", text))
+    for raw in _TOKEN.findall(text):
+        parts = [p for p in raw.split("'") if p]
+        if not parts:
+            continue
+        if len(parts) > 1 and _fold(parts[0]) in _FRENCH_ELISIONS:
+            original = parts[1]
+        else:
+            original = parts[0]
+
+        word = _fold(original)
+        if word not in _STOPWORDS:
+            yield original, word
+
+
+def tokenize(text: str, stem_prefix: int = STEM_PREFIX) -> List[str]:
+    """Türkçe/Fransızca duyarlı tokenizer
+
+    - Kesme işareti: Fransızca önekler (l', d', qu') atılır, Türkçe ekler (FDM'ye) atılır
+    - Sondan eklemeli Türkçe için ilk `stem_prefix` harf kök olarak kullanılır (raporu/raporları -> rapor)
+    - Rakam içeren kelimeler (E10023, PLU12345) kök almadan korunur; büyük harfle yazılmış etiketler
+      (PARAMÈTRES, Z RAPORU) küçük harfli yazımlarıyla aynı kökü alır
+    - Tek harfli kodlar ("Z raporu") korunur
+    """
+    return [word if _has_digit(word) else word[:stem_prefix] for _, word in _words(text)]
+
+
+def code_tokens(text: str) -> frozenset:
+    """Birebir eşleşmesi gereken kelimeler: tek harf, rakam içeren veya büyük harfle yazılmış (Z, E10023, FDM)
+
+    "Z raporu" ile "X raporu" gibi tek kelimesi farklı sorular kelime benzerliğiyle
+    ayırt edilemez; SSS eşleşmesinde bu kümelerin aynı olması ayrıca istenir.
+    """
+    return frozenset(
+        word for original, word in _words(text)
+        if len(word) == 1 or _has_digit(word) or original.isupper()
+    )
+
+
+class BM25Index:
+    """Okapi BM25 inverted index (JSON olarak saklanabilir)
+
+    postings/idf dict yerine `.get` / `[]` destekleyen herhangi bir eşleme olabilir;
+    backend'deki paylaşılan indeks bunları mmap'li dizilerden verir.
+    """
+
+    def __init__(self, postings: Dict[str, List[List[int]]], doc_lengths: List[int],
+                 k1: float = 1.5, b: float = 0.75, stem_prefix: int = STEM_PREFIX,
+                 idf: Dict[str, float] = None):
+        self.postings = postings
+        self.doc_lengths = doc_lengths
+        self.k1 = k1
+        self.b = b
+        self.stem_prefix = stem_prefix
+
+        n = len(doc_lengths)
+        self.avgdl = (sum(doc_lengths) / n) if n else 0.0
+        if idf is None:
+            idf = {
+                term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                for term, docs in postings.items()
+            }
+        self.idf = idf
+
+    @classmethod
+    def build(cls, texts: List[str], **kwargs) -> "BM25Index":
+        postings = defaultdict(list)
+        doc_lengths = []
+        stem_prefix = kwargs.get("stem_prefix", STEM_PREFIX)
+
+        for doc_id, text in enumerate(texts):
+            terms = tokenize(text, stem_prefix)
+            doc_lengths.append(len(terms))
+            for term, tf in Counter(terms).items():
+                postings[term].append([doc_id, tf])
+
+        return cls(dict(postings), doc_lengths, **kwargs)
+
+    @classmethod
+    def from_dict(cls, data: Dict) -> "BM25Index":
+        return cls(
+            data["postings"],
+            data["doc_lengths"],
+            k1=data.get("k1", 1.5),
+            b=data.get("b", 0.75),
+            stem_prefix=data.get("stem_prefix", STEM_PREFIX)
+        )
+
+    @staticmethod
+    def is_current(data: Dict) -> bool:
+        """Kaydedilmiş index güncel tokenizer ile mi oluşturulmuş"""
+        return data.get("tokenizer") == TOKENIZER_VERSION
+
+    def to_dict(self) -> Dict:
+        return {
+            "tokenizer": TOKENIZER_VERSION,
+            "k1": self.k1,
+            "b": self.b,
+            "stem_prefix": self.stem_prefix,
+            "doc_lengths": self.doc_lengths,
+            "postings": self.postings,
+        }
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def search(self, query: str, top_k: int = 10) -> List[Tuple[int, float]]:
+        """(doc_id, skor) listesi, skora göre azalan"""
+        scores = defaultdict(float)
+        for term in set(tokenize(query, self.stem_prefix)):
+            docs = self.postings.get(term)
+            if docs is None:
+                continue
+            idf = self.idf[term]
+            for doc_id, tf in docs:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / self.avgdl)
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:top_k]
+
+
+def reciprocal_rank_fusion(rankings: List[List[Hashable]], k: int = 60) -> List[Tuple[Hashable, float]]:
+    """Birden fazla sıralamayı RRF ile birleştir: skor = Σ 1 / (k + sıra)"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
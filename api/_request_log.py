@@ -0,0 +1,189 @@
+"""
+İstek loglama - soru trafiğini bloklamadan JSONL dosyalarına yazar
+Kayıtlar bir kuyruğa atılır, arka plandaki thread dosyaya yazar ve dosyayı döndürür (rotation)
+Vercel'de dosya sistemi kalıcı olmadığından kayıtlar senkron olarak stdout'a (runtime log akışı) yazılır
+scripts/build_faq.py bu logları (veya dışa aktarılmış Vercel loglarını) okuyarak sık sorulan soruları çıkarır
+"""
+
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from datetime import datetime, timezone
+
+LOG_FILE_PATTERN = "questions.{source}.{slot}.jsonl"
+SLOT_LOCK_PATTERN = ".questions.{source}.{slot}.lock"
+
+# stdout'a yazılan kayıtların diğer çıktılardan ayırt edilmesi için önek
+STDOUT_PREFIX = "request_log "
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Kuyruk doluysa kaydı sessizce atar; istek yolu asla beklemez"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Mesaj zaten JSON string; varsayılan format/kopyalama maliyetinden kaçın
+        return record
+
+
+def _claim_slot(log_dir: str, source: str):
+    """Boştaki en küçük worker slot'unu kilitle
+
+    Her süreç kendi dosyasına yazar (çok worker'lı kurulumda rotation çakışmaz). Dosya adı
+    PID yerine slot numarası içerdiğinden yeniden başlatmalarda aynı rotation seti kullanılır
+    ve disk kullanımı worker sayısı x (backup_count + 1) dosya ile sınırlı kalır.
+    Kilit süreç bitince işletim sistemi tarafından bırakılır.
+    """
+    slot = 0
+    while True:
+        lock_file = open(os.path.join(log_dir, SLOT_LOCK_PATTERN.format(source=source, slot=slot)), "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return slot, lock_file
+        except OSError:
+            lock_file.close()
+            slot += 1
+
+
+class RequestLogger:
+    """Soruları asenkron olarak döndürülen JSONL dosyalarına yazar
+
+    log_dir None ise kayıtlar senkron olarak stdout'a yazılır (Vercel: /tmp instance'a özel ve
+    geçicidir, arka plan thread'i instance dondurulmadan önce yazmayı bitiremeyebilir).
+    """
+
+    def __init__(self, log_dir: str, source: str, max_bytes: int = 5 * 1024 * 1024,
+                 backup_count: int = 5, max_queue: int = 10000):
+        self.source = source
+        self.log_dir = log_dir
+        self._handler = None
+        self._listener = None
+        self._slot_lock = None
+        self._stdout = log_dir is None
+
+        if self._stdout:
+            return
+
+        try:
+            os.makedirs(log_dir, exist_ok=True)
+            slot, self._slot_lock = _claim_slot(log_dir, source)
+            file_handler = logging.handlers.RotatingFileHandler(
+                os.path.join(log_dir, LOG_FILE_PATTERN.format(source=source, slot=slot)),
+                maxBytes=max_bytes,
+                backupCount=backup_count,
+                encoding="utf-8"
+            )
+            file_handler.setFormatter(logging.Formatter("%(message)s"))
+        except OSError as e:
+            # Salt okunur dosya sistemi vb. - loglama kapalı, servis çalışmaya devam eder
+            print(f"⚠️  İstek logu açılamadı ({log_dir}): {e}")
+            return
+
+        self._handler = _DroppingQueueHandler(queue.Queue(maxsize=max_queue))
+        self._listener = logging.handlers.QueueListener(self._handler.queue, file_handler)
+        self._listener.start()
+        atexit.register(self.close)
+
+        self._logger = logging.getLogger(f"request_log.{source}")
+        self._logger.setLevel(logging.INFO)
+        self._logger.propagate = False
+        self._logger.addHandler(self._handler)
+
+    @property
+    def enabled(self) -> bool:
+        return self._stdout or self._handler is not None
+
+    @property
+    def dropped(self) -> int:
+        return self._handler.dropped if self._handler else 0
+
+    def log(self, question: str, **fields):
+        """Bir soruyu kaydet (dosya modunda bloklamaz)"""
+        if not self.enabled:
+            return
+
+        record = {
+            "ts": datetime.now(timezone.utc).isoformat(),
+            "source": self.source,
+            "question": question,
+        }
+        record.update(fields)
+
+        try:
+            line = json.dumps(record, ensure_ascii=False)
+            if self._stdout:
+                sys.stdout.write(STDOUT_PREFIX + line + "\n")
+                sys.stdout.flush()
+            else:
+                self._logger.info(line)
+        except Exception as e:
+            print(f"⚠️  İstek loglanamadı: {e}")
+
+    def close(self):
+        """Kuyruktaki kayıtları dosyaya yazıp thread'i durdur"""
+        if self._listener:
+            self._listener.stop()
+            self._listener = None
+        if self._slot_lock:
+            self._slot_lock.close()
+            self._slot_lock = None
+
+
+def _parse_line(line: str):
+    """Log satırından kaydı çıkar: JSONL dosyası, stdout öneki veya Vercel log export/drain formatı"""
+    line = line.strip()
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError:
+        record = None
+
+    if isinstance(record, dict):
+        if record.get("question"):
+            return record
+        # Vercel log export / log drain: asıl satır 'message' alanında
+        if isinstance(record.get("message"), str):
+            return _parse_line(record["message"])
+        return None
+
+    start = line.find(STDOUT_PREFIX)
+    if start < 0:
+        return None
+    try:
+        record = json.loads(line[start + len(STDOUT_PREFIX):])
+    except json.JSONDecodeError:
+        return None
+    return record if isinstance(record, dict) and record.get("question") else None
+
+
+def iter_logged_questions(path: str):
+    """Tüm log kayıtlarını oku (build_faq.py için)
+
+    path bir dizinse döndürülmüş dosyalar dahil JSONL logları, dosyaysa
+    (ör. dışa aktarılmış Vercel runtime logları) içindeki istek kayıtları okunur.
+    """
+    if os.path.isdir(path):
+        paths = sorted(glob.glob(os.path.join(path, "questions.*.jsonl*")))
+    else:
+        paths = [path]
+
+    for file_path in paths:
+        with open(file_path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = _parse_line(line)
+                if record is not None:
+                    yield record
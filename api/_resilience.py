@@ -0,0 +1,176 @@
+"""
+OpenAI çağrıları için dayanıklılık katmanı
+- Deadline: istek bütçesinden her aşamaya düşen süre
+- LatencyTracker: son çağrıların p95 gecikmesi (hedge gecikmesi için)
+- RetryBudget: tekrar denemeleri ve hedge'leri başarılı çağrıların bir oranıyla sınırlar
+- hedged_call / call_with_retries: timeout'lu, bütçeli çağrı yardımcıları
+- degraded_answer: bütçe dolduğunda LLM cevabı yerine dönen yanıt
+"""
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional
+
+import openai
+
+# Tekrar denemenin işe yarayabileceği geçici hatalar; 400/401/403 gibi hatalar hemen fırlatılır
+RETRYABLE_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+
+# Hedge edilen çağrılar bu havuzda çalışır; kaybeden çağrı kendi timeout'una kadar arka planda biter
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="openai-hedge")
+
+
+class DeadlineExceeded(Exception):
+    """İstek bütçesi bu aşama için yetersiz"""
+
+
+class Deadline:
+    """Toplam istek bütçesi; her aşama kalan süreden pay alır"""
+
+    def __init__(self, budget_seconds: float):
+        self.budget = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def stage(self, max_seconds: Optional[float] = None, reserve: float = 0.0, min_seconds: float = 0.5) -> float:
+        """Bir aşama için timeout; sonraki aşamalar için `reserve` saniye bırakır"""
+        available = self.remaining() - reserve
+        if max_seconds is not None:
+            available = min(available, max_seconds)
+        if available < min_seconds:
+            raise DeadlineExceeded(f"Kalan süre yetersiz ({self.remaining():.1f}s)")
+        return available
+
+
+class LatencyTracker:
+    """Son N çağrının gecikmesinden yüzdelik hesaplar"""
+
+    def __init__(self, window: int = 200, default: float = 1.0, min_samples: int = 20):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.default = default
+        self.min_samples = min_samples
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> float:
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return self.default
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+        return ordered[index]
+
+
+class RetryBudget:
+    """Token bucket: her ilk deneme `ratio` token ekler, her retry/hedge 1 token harcar
+
+    Böylece ek çağrılar toplam trafiğin en fazla `ratio` oranı kadar olur ve
+    upstream yavaşladığında yükü katlayan bir retry fırtınası oluşmaz.
+    """
+
+    def __init__(self, ratio: float = 0.1, max_tokens: float = 10.0, initial_tokens: float = 3.0):
+        self.ratio = ratio
+        self.max_tokens = max_tokens
+        self._tokens = initial_tokens
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_withdraw(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1.0:
+                self._tokens -= 1.0
+                return True
+            return False
+
+    @property
+    def tokens(self) -> float:
+        return self._tokens
+
+
+def _timed(fn: Callable, timeout: float, tracker: Optional[LatencyTracker]):
+    started = time.monotonic()
+    result = fn(timeout)
+    if tracker is not None:
+        tracker.record(time.monotonic() - started)
+    return result
+
+
+def hedged_call(fn: Callable, timeout: float, tracker: LatencyTracker, budget: RetryBudget,
+                hedge_percentile: float = 95):
+    """`fn(timeout)` çağır; p95 süresinde bitmezse bütçe izin verirse ikinci bir kopya gönder
+
+    İlk biten başarılı sonuç döner. Her iki kopya da başarısız olursa son hata fırlatılır.
+    """
+    budget.deposit()
+    started = time.monotonic()
+    pending = {_executor.submit(_timed, fn, timeout, tracker)}
+
+    hedge_delay = min(tracker.percentile(hedge_percentile), timeout)
+    done, pending = wait(pending, timeout=hedge_delay, return_when=FIRST_COMPLETED)
+
+    if not done and budget.try_withdraw():
+        hedge_timeout = timeout - (time.monotonic() - started)
+        if hedge_timeout > 0:
+            pending.add(_executor.submit(_timed, fn, hedge_timeout, tracker))
+
+    last_error = None
+    while True:
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            last_error = future.exception()
+
+        remaining = timeout - (time.monotonic() - started)
+        if not pending or remaining <= 0:
+            break
+        done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+
+    if last_error is not None:
+        raise last_error
+    raise DeadlineExceeded(f"Çağrı {timeout:.1f}s içinde tamamlanmadı")
+
+
+def call_with_retries(fn: Callable, deadline: Deadline, budget: RetryBudget,
+                      max_attempts: int = 2, **stage_kwargs):
+    """`fn(timeout)` çağır; geçici bir hata olursa deadline ve retry bütçesi izin verdikçe tekrar dene"""
+    budget.deposit()
+    attempt = 0
+
+    while True:
+        attempt += 1
+        timeout = deadline.stage(**stage_kwargs)
+        try:
+            return fn(timeout)
+        except RETRYABLE_ERRORS as e:
+            if attempt >= max_attempts or not budget.try_withdraw():
+                raise
+            print(f"⚠️  OpenAI çağrısı başarısız, tekrar deneniyor ({attempt}/{max_attempts}): {e}")
+
+
+def degraded_answer(sources: List) -> Dict:
+    """Bütçe dolduğunda LLM cevabı yerine bulunan kaynakları döndür"""
+    if sources:
+        answer = ("Şu anda cevap üretilemedi. Sorunuzla ilgili kullanıcı klavuzu bölümleri aşağıdadır; "
+                  "lütfen biraz sonra tekrar deneyin.")
+    else:
+        answer = "Sistem şu anda yoğun, lütfen biraz sonra tekrar deneyin."
+    return {"answer": answer, "sources": sources, "degraded": True}
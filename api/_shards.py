@@ -0,0 +1,195 @@
+"""
+Birden fazla kullanım kılavuzu (cihaz modeli / dil / sürüm) için parçalı (sharded) knowledge base
+Her kılavuz data/ altında kendi JSON dosyasında durur ve data/kb_manifest.json'da listelenir.
+Shard'lar ilk kullanımda yüklenir; bellek sınırı aşılınca en uzun süredir kullanılmayan (LRU) boşaltılır.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from _faq import FAQTable
+from _lexical import BM25Index
+
+MANIFEST_NAME = "kb_manifest.json"
+DEFAULT_SHARD = "default"
+
+
+def compute_version(chunks: List[Dict]) -> str:
+    """Chunk metinlerinden türetilen sürüm (FAQ tablosunu KB'ye bağlar)"""
+    digest = hashlib.sha256()
+    for chunk in chunks:
+        digest.update(chunk['text'].encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()[:16]
+
+
+def load_manifest(data_dir: str) -> Dict:
+    """Manifest'i oku; yoksa tek kılavuzluk eski yapıyı (knowledge_base.json) varsay"""
+    path = os.path.join(data_dir, MANIFEST_NAME)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {
+            "default": DEFAULT_SHARD,
+            "shards": {
+                DEFAULT_SHARD: {"file": "knowledge_base.json", "faq": "faq_answers.json"}
+            }
+        }
+
+
+def register_shard(data_dir: str, name: str, file: str, make_default: bool = False, **info) -> Dict:
+    """Manifest'e shard ekle veya güncelle (process_pdf.py için)"""
+    path = os.path.join(data_dir, MANIFEST_NAME)
+    manifest = load_manifest(data_dir)
+    if not os.path.exists(path):
+        # Varsayılan tek kılavuz dosyası yoksa onu manifest'e yazma
+        manifest["shards"] = {
+            n: i for n, i in manifest["shards"].items()
+            if os.path.exists(os.path.join(data_dir, i["file"]))
+        }
+
+    entry = manifest["shards"].get(name, {})
+    entry.update({"file": file, **{k: v for k, v in info.items() if v is not None}})
+    manifest["shards"][name] = entry
+
+    if make_default or manifest.get("default") not in manifest["shards"]:
+        manifest["default"] = name
+
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+class KnowledgeShard:
+    """Belleğe yüklenmiş tek bir kılavuz: chunk'lar, embedding matrisi, BM25 index, FAQ tablosu"""
+
+    def __init__(self, name: str, path: str, info: Dict, data_dir: str):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        self.name = name
+        self.info = info
+        self.metadata = data.get('metadata', {})
+        self.chunks = data.get('chunks', [])
+        self.version = compute_version(self.chunks)
+
+        # Embedding'ler Python listesi yerine tek bir float32 matris olarak tutulur
+        matrix = np.asarray([chunk.pop('embedding') for chunk in self.chunks], dtype=np.float32)
+        if len(self.chunks):
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix = matrix / norms
+        self.embedding_matrix = matrix
+
+        if BM25Index.is_current(data.get('lexical_index', {})):
+            self.lexical_index = BM25Index.from_dict(data['lexical_index'])
+        else:
+            self.lexical_index = BM25Index.build([chunk['text'] for chunk in self.chunks])
+            print(f"ℹ '{name}' shard'ında güncel lexical index yok, yerinde oluşturuldu")
+
+        self._faq_path = os.path.join(data_dir, info['faq']) if info.get('faq') else None
+        self._faq = None
+
+        # Yaklaşık bellek kullanımı (LRU bellek sınırı için)
+        postings = sum(len(docs) for docs in self.lexical_index.postings.values())
+        self.memory_bytes = (
+            self.embedding_matrix.nbytes
+            + sum(len(chunk['text']) for chunk in self.chunks) * 2
+            + postings * 64
+        )
+
+    def faq(self, min_similarity: float = 0.8) -> Optional[FAQTable]:
+        """Bu shard'ın SSS tablosu (KB sürümü uyuşmazsa None)"""
+        if self._faq is None:
+            table = FAQTable.load(self._faq_path, min_similarity=min_similarity) if self._faq_path else None
+            if table is not None and table.kb_version != self.version:
+                print(f"ℹ '{self.name}' FAQ tablosu eski KB sürümü için ({table.kb_version}), kullanılmıyor")
+                table = None
+            elif table is not None:
+                print(f"✓ '{self.name}' FAQ tablosu yüklendi: {len(table)} kayıt")
+            self._faq = table or False
+        return self._faq or None
+
+
+class ShardRegistry:
+    """Manifest'teki shard'ları tembel yükler, bellek sınırında LRU ile boşaltır"""
+
+    def __init__(self, data_dir: str, memory_cap_bytes: int):
+        self.data_dir = data_dir
+        self.memory_cap_bytes = memory_cap_bytes
+        self.manifest = load_manifest(data_dir)
+        self._loaded = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def default(self) -> str:
+        return self.manifest.get("default") or next(iter(self.manifest["shards"]), DEFAULT_SHARD)
+
+    def names(self) -> List[str]:
+        return list(self.manifest["shards"])
+
+    def loaded_names(self) -> List[str]:
+        return list(self._loaded)
+
+    def memory_used(self) -> int:
+        return sum(shard.memory_bytes for shard in self._loaded.values())
+
+    def resolve(self, name: str = None, device: str = None, language: str = None) -> Optional[str]:
+        """İstekteki seçimi shard adına çevir: açık ad > cihaz/dil eşleşmesi > varsayılan
+
+        Bilinmeyen bir ad veya hiçbir shard'la eşleşmeyen cihaz/dil için None döner.
+        """
+        shards = self.manifest["shards"]
+        if name:
+            return name if name in shards else None
+        if not device and not language:
+            return self.default
+
+        def matches(info):
+            return ((not device or str(info.get("device", "")).casefold() == device.casefold())
+                    and (not language or str(info.get("language", "")).casefold() == language.casefold()))
+
+        # Varsayılan shard eşleşiyorsa onu tercih et
+        candidates = [n for n, info in shards.items() if matches(info)]
+        if self.default in candidates:
+            return self.default
+        return candidates[0] if candidates else None
+
+    def get(self, name: str = None) -> Optional[KnowledgeShard]:
+        """Shard'ı döndür; yüklü değilse yükle ve gerekirse en eskiyi boşalt"""
+        name = name or self.default
+        info = self.manifest["shards"].get(name)
+        if info is None:
+            return None
+
+        with self._lock:
+            shard = self._loaded.get(name)
+            if shard is not None:
+                self._loaded.move_to_end(name)
+                return shard
+
+            path = os.path.join(self.data_dir, info["file"])
+            try:
+                shard = KnowledgeShard(name, path, info, self.data_dir)
+            except Exception as e:
+                print(f"❌ Shard yüklenemedi '{name}': {e}")
+                print(f"   Tried path: {path}")
+                return None
+
+            self._loaded[name] = shard
+            print(f"✓ Shard yüklendi '{name}': {len(shard.chunks)} chunks, "
+                  f"~{shard.memory_bytes / (1024 * 1024):.1f} MB")
+
+            # Yeni yüklenen shard hariç, sınır altına inene kadar LRU boşalt
+            while self.memory_used() > self.memory_cap_bytes and len(self._loaded) > 1:
+                evicted, _ = self._loaded.popitem(last=False)
+                print(f"ℹ Shard bellekten çıkarıldı (LRU): '{evicted}'")
+
+            return shard
@@ -1,17 +1,45 @@
 """
 Vercel Serverless Function - Chat API
 Knowledge base JSON'dan yüklenir ve vector search yapılır
+Birden fazla kılavuz data/kb_manifest.json'daki shard'lar olarak ilk kullanımda yüklenir
 """
 
 import json
 import os
+import sys
+import time
 import numpy as np
 from openai import OpenAI
 from http.server import BaseHTTPRequestHandler
 
+# api/ içindeki yardımcı modüller (_ ile başlayanlar Vercel'de endpoint olmaz)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from _request_log import RequestLogger
+from _lexical import reciprocal_rank_fusion
+from _shards import ShardRegistry
+from _resilience import (
+    Deadline, DeadlineExceeded, LatencyTracker, RetryBudget, hedged_call, call_with_retries, degraded_answer
+)
+
 # Global variables
-KNOWLEDGE_BASE = None
+_shards = None
 _client = None
+_request_logger = None
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Vercel maxDuration (60s) dolmadan cevap dönebilmek için toplam bütçe ve aşama sınırları
+REQUEST_BUDGET_SECONDS = float(os.getenv("REQUEST_BUDGET_SECONDS", 45))
+EMBEDDING_TIMEOUT = float(os.getenv("EMBEDDING_TIMEOUT", 5))
+COMPLETION_TIMEOUT = float(os.getenv("COMPLETION_TIMEOUT", 40))
+
+# Aynı anda bellekte tutulacak shard'ların toplam boyutu (vercel.json memory: 1024 MB)
+SHARD_MEMORY_MB = float(os.getenv("SHARD_MEMORY_MB", 512))
+
+# Warm instance boyunca paylaşılır
+_embedding_latency = LatencyTracker(default=1.0)
+_retry_budget = RetryBudget(ratio=float(os.getenv("RETRY_BUDGET_RATIO", 0.1)))
 
 
 def get_openai_client():
@@ -27,7 +55,8 @@ def get_openai_client():
         raise Exception("OPENAI_API_KEY environment variable not set")
 
     try:
-        _client = OpenAI(api_key=api_key)
+        # SDK'nın kendi retry'ları kapalı; tekrar denemeler retry bütçesinden yapılır
+        _client = OpenAI(api_key=api_key, timeout=COMPLETION_TIMEOUT, max_retries=0)
         print(f"✓ OpenAI client initialized (key length: {len(api_key)})")
         return _client
     except Exception as e:
@@ -35,71 +64,118 @@ def get_openai_client():
         raise
 
 
-def load_knowledge_base():
-    """Knowledge base'i yükle (bir kere)"""
-    global KNOWLEDGE_BASE
+def get_shard_registry():
+    """Lazy initialize shard registry (manifest okunur, shard'lar henüz yüklenmez)"""
+    global _shards
 
-    if KNOWLEDGE_BASE is not None:
-        return KNOWLEDGE_BASE
+    if _shards is None:
+        _shards = ShardRegistry(
+            os.path.join(BASE_DIR, 'data'),
+            memory_cap_bytes=int(SHARD_MEMORY_MB * 1024 * 1024)
+        )
+    return _shards
 
-    # Knowledge base path
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    kb_path = os.path.join(base_dir, 'data', 'knowledge_base.json')
 
-    try:
-        with open(kb_path, 'r', encoding='utf-8') as f:
-            KNOWLEDGE_BASE = json.load(f)
-        print(f"✓ Knowledge base loaded: {len(KNOWLEDGE_BASE.get('chunks', []))} chunks")
-        return KNOWLEDGE_BASE
-    except Exception as e:
-        print(f"❌ Error loading knowledge base: {e}")
-        print(f"   Tried path: {kb_path}")
-        print(f"   Base dir: {base_dir}")
+def load_knowledge_base(shard_name=None):
+    """Shard'ı yükle (ilk kullanımda); ad verilmezse varsayılan kılavuz"""
+    return get_shard_registry().get(shard_name)
+
+
+def get_knowledge_base_version(shard_name=None):
+    """Knowledge base içeriğinden türetilen sürüm (FAQ tablosunu KB'ye bağlar)"""
+    shard = load_knowledge_base(shard_name)
+    return shard.version if shard else None
+
+
+def load_faq_table(shard_name=None):
+    """Önceden hesaplanmış SSS tablosunu yükle (KB sürümü uyuşmazsa kullanılmaz)"""
+    shard = load_knowledge_base(shard_name)
+    if not shard:
         return None
+    return shard.faq(min_similarity=float(os.getenv("FAQ_MIN_SIMILARITY", 0.8)))
+
+
+def get_request_logger():
+    """Lazy initialize request logger
+
+    Vercel'de /tmp instance'a özel ve geçici olduğundan kayıtlar stdout'a (runtime logları) yazılır;
+    REQUEST_LOG_DIR verilirse (ör. local test) dosyaya yazılır.
+    """
+    global _request_logger
+
+    if _request_logger is None:
+        _request_logger = RequestLogger(os.getenv("REQUEST_LOG_DIR"), source="vercel")
+    return _request_logger
+
 
+def rank_by_embedding(shard, query_embedding, top_k=3):
+    """(chunk index'leri, tüm chunk'lar için cosine similarity) döndür"""
+    if not shard.chunks:
+        return [], None
 
-def cosine_similarity(vec1, vec2):
-    """İki vektör arasındaki cosine similarity hesapla"""
-    vec1 = np.array(vec1)
-    vec2 = np.array(vec2)
-    dot_product = np.dot(vec1, vec2)
-    norm1 = np.linalg.norm(vec1)
-    norm2 = np.linalg.norm(vec2)
-    if norm1 == 0 or norm2 == 0:
-        return 0.0
-    return dot_product / (norm1 * norm2)
+    query = np.asarray(query_embedding, dtype=np.float32)
+    norm = np.linalg.norm(query)
+    if norm == 0:
+        return [], None
 
+    similarities = shard.embedding_matrix @ (query / norm)
+    return np.argsort(-similarities)[:top_k].tolist(), similarities
 
-def search_similar_chunks(query_embedding, top_k=3):
-    """Query embedding'e en yakın chunk'ları bul"""
-    kb = load_knowledge_base()
 
-    if not kb or 'chunks' not in kb:
+def search_chunks(question, query_embedding=None, top_k=3, candidates=10, shard_name=None):
+    """Hibrit arama: BM25 ve vektör sıralamalarını RRF ile birleştir
+
+    query_embedding yoksa (embedding API yavaş/erişilemez) sadece lexical sonuçlar döner.
+    """
+    shard = load_knowledge_base(shard_name)
+    if not shard or not shard.chunks:
         return []
 
-    chunks = kb['chunks']
-    similarities = []
+    chunks = shard.chunks
+    lexical_ranking = [doc_id for doc_id, _ in shard.lexical_index.search(question, top_k=candidates)]
 
-    for chunk in chunks:
-        sim = cosine_similarity(query_embedding, chunk['embedding'])
-        similarities.append({'chunk': chunk, 'similarity': sim})
+    if query_embedding is None:
+        return [{'chunk': chunks[i], 'similarity': 0.0} for i in lexical_ranking[:top_k]]
 
-    similarities.sort(key=lambda x: x['similarity'], reverse=True)
-    return similarities[:top_k]
+    vector_ranking, similarities = rank_by_embedding(shard, query_embedding, top_k=candidates)
+    if similarities is None:
+        return [{'chunk': chunks[i], 'similarity': 0.0} for i in lexical_ranking[:top_k]]
 
+    fused = reciprocal_rank_fusion([vector_ranking, lexical_ranking])[:top_k]
+    return [{'chunk': chunks[i], 'similarity': float(similarities[i])} for i, _ in fused]
 
-def generate_answer(question: str):
-    """Soruya cevap üret"""
-    try:
-        client = get_openai_client()
 
-        query_response = client.embeddings.create(
+def embed_question(question: str, deadline: Deadline):
+    """Soru embedding'i; p95 süresinde dönmezse hedge edilir"""
+    client = get_openai_client()
+    timeout = deadline.stage(max_seconds=EMBEDDING_TIMEOUT, reserve=5)
+
+    def call(call_timeout):
+        response = client.with_options(timeout=call_timeout).embeddings.create(
             model="text-embedding-3-small",
             input=question
         )
-        query_embedding = query_response.data[0].embedding
+        return response.data[0].embedding
+
+    return hedged_call(call, timeout, _embedding_latency, _retry_budget)
+
+
+def generate_answer(question: str, shard_name=None):
+    """Soruya cevap üret"""
+    deadline = Deadline(REQUEST_BUDGET_SECONDS)
+    sources = []
 
-        similar_chunks = search_similar_chunks(query_embedding, top_k=3)
+    try:
+        client = get_openai_client()
+
+        # Embedding API yavaş veya erişilemezse lexical sonuçlarla devam et
+        try:
+            query_embedding = embed_question(question, deadline)
+        except Exception as e:
+            print(f"Embedding alınamadı, sadece lexical arama kullanılıyor: {e}")
+            query_embedding = None
+
+        similar_chunks = search_chunks(question, query_embedding, top_k=3, shard_name=shard_name)
 
         if not similar_chunks:
             return {
@@ -108,7 +184,6 @@ def generate_answer(question: str):
             }
 
         context_parts = []
-        sources = []
 
         for item in similar_chunks:
             chunk = item['chunk']
@@ -116,6 +191,8 @@ def generate_answer(question: str):
             sources.append({
                 'text': chunk['text'][:200] + '...' if len(chunk['text']) > 200 else chunk['text'],
                 'page': chunk.get('page_number', 0),
+                # Birleştirilen tekrar chunk'ların sayfaları da dahil
+                'pages': chunk.get('page_numbers', [chunk.get('page_number', 0)]),
                 'similarity': float(item['similarity'])
             })
 
@@ -134,22 +211,33 @@ Kullanıcı Sorusu: {question}
 
 Lütfen yukarıdaki kullanıcı klavuzu bilgilerine dayanarak soruyu cevapla."""
 
-        completion = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=800,
-            temperature=0.7
+        def complete(call_timeout):
+            return client.with_options(timeout=call_timeout).chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                max_tokens=800,
+                temperature=0.7
+            )
+
+        completion = call_with_retries(
+            complete, deadline, _retry_budget,
+            max_seconds=COMPLETION_TIMEOUT, min_seconds=2
         )
 
         answer = completion.choices[0].message.content
 
         return {"answer": answer, "sources": sources[:2]}
 
+    except DeadlineExceeded as e:
+        print(f"Deadline exceeded in generate_answer: {e}")
+        return degraded_answer(sources)
     except Exception as e:
         print(f"Error in generate_answer: {e}")
+        if sources:
+            return degraded_answer(sources)
         return {"answer": f"Bir hata oluştu: {str(e)}", "sources": []}
 
 
@@ -169,12 +257,16 @@ class handler(BaseHTTPRequestHandler):
 
     def do_GET(self):
         try:
+            registry = get_shard_registry()
             kb = load_knowledge_base()
             response = {
                 "status": "ok",
                 "message": "Chat API is running",
                 "knowledge_base_loaded": kb is not None,
-                "chunks_count": len(kb.get('chunks', [])) if kb else 0
+                "chunks_count": len(kb.chunks) if kb else 0,
+                "default_manual": registry.default,
+                "manuals": registry.names(),
+                "loaded_manuals": registry.loaded_names()
             }
 
             self._set_headers(200)
@@ -197,7 +289,38 @@ class handler(BaseHTTPRequestHandler):
                 self.wfile.write(json.dumps({"error": "Question is required"}).encode())
                 return
 
-            result = generate_answer(question)
+            # Kılavuz seçimi: açık ad (manual) veya cihaz/dil ile yönlendirme
+            shard_name = get_shard_registry().resolve(
+                name=data.get('manual'),
+                device=data.get('device'),
+                language=data.get('language')
+            )
+            if shard_name is None:
+                self._set_headers(400)
+                self.wfile.write(json.dumps({"error": "Unknown manual"}).encode())
+                return
+
+            started = time.monotonic()
+            tier = "rag"
+
+            # Sık sorulan sorular için embedding/LLM çağrısı yok
+            faq = load_faq_table(shard_name)
+            entry = faq.lookup(question) if faq else None
+            if entry:
+                tier = "faq"
+                result = {"answer": entry["answer"], "sources": entry.get("sources", [])}
+            else:
+                result = generate_answer(question, shard_name=shard_name)
+                if result.get("degraded"):
+                    tier = "degraded"
+
+            get_request_logger().log(
+                question,
+                tier=tier,
+                latency_ms=round((time.monotonic() - started) * 1000),
+                shard=shard_name,
+                kb_version=get_knowledge_base_version(shard_name)
+            )
 
             self._set_headers(200)
             self.wfile.write(json.dumps(result, ensure_ascii=False).encode('utf-8'))
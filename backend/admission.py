@@ -0,0 +1,144 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Dict
+
+
+class AdmissionRejected(Exception):
+    """Kapasite dolu olduğunda isteğin reddedildiğini bildirir"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """LLM çağrılarının önünde sınırlı eşzamanlılık ve bekleme kuyruğu
+
+    En fazla `max_concurrent` istek aynı anda OpenAI'a gider. Geri kalanlar
+    en fazla `max_queue` derinliğindeki kuyrukta `queue_timeout` saniye
+    bekler; kuyruk doluysa ya da süre dolarsa istek hemen reddedilir.
+    """
+
+    def __init__(self, max_concurrent: int = 4, max_queue: int = 16, queue_timeout: float = 10.0):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        # Python 3.8/3.9'da Semaphore oluşturulduğu andaki loop'a bağlanır; bu yüzden
+        # import sırasında değil, uvicorn'un loop'u içinde ilk slot() çağrısında oluşturulur
+        self._semaphore = None
+
+        self.active = 0
+        self.waiting = 0
+
+        # İstatistikler
+        self.admitted_total = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.last_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self._total_wait_seconds = 0.0
+        self._wait_count = 0
+        self._avg_service_seconds = 0.0
+
+    def _estimate_retry_after(self) -> int:
+        """Kuyruğun boşalması için tahmini süre (saniye)"""
+        service = self._avg_service_seconds or self.queue_timeout
+        rounds = (self.waiting + 1) / self.max_concurrent
+        return max(1, math.ceil(service * rounds))
+
+    def _record_wait(self, started: float):
+        waited = time.monotonic() - started
+        self.last_wait_seconds = waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self._total_wait_seconds += waited
+        self._wait_count += 1
+
+    def _record_service(self, started: float):
+        elapsed = time.monotonic() - started
+        # Üssel hareketli ortalama
+        if self._avg_service_seconds == 0.0:
+            self._avg_service_seconds = elapsed
+        else:
+            self._avg_service_seconds = 0.8 * self._avg_service_seconds + 0.2 * elapsed
+
+    def _abandon(self, acquire: "asyncio.Future"):
+        """Beklemekten vazgeçilen acquire'ı iptal et; o arada izin alınmışsa geri bırak"""
+        acquire.cancel()
+
+        def release_if_acquired(future):
+            if not future.cancelled() and future.exception() is None:
+                self._semaphore.release()
+
+        acquire.add_done_callback(release_if_acquired)
+
+    async def _acquire(self) -> bool:
+        """Semaforu `queue_timeout` içinde al
+
+        asyncio.wait_for, Python 3.12 öncesinde timeout ile acquire aynı anda
+        tamamlanırsa alınan izni kaybedebilir. Bunun yerine acquire ayrı bir görev
+        olarak beklenir; vazgeçildiğinde o arada alınmış bir izin geri bırakılır.
+        """
+        acquire = asyncio.ensure_future(self._semaphore.acquire())
+        try:
+            await asyncio.wait({acquire}, timeout=self.queue_timeout)
+        except asyncio.CancelledError:
+            self._abandon(acquire)
+            raise
+
+        if acquire.done():
+            return True
+        self._abandon(acquire)
+        return False
+
+    @asynccontextmanager
+    async def slot(self):
+        """Bir LLM çağrısı için yer ayır; kapasite yoksa AdmissionRejected fırlat"""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent)
+
+        if self.active + self.waiting >= self.max_concurrent + self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected("Kuyruk dolu", self._estimate_retry_after())
+
+        self.waiting += 1
+        wait_started = time.monotonic()
+        try:
+            acquired = await self._acquire()
+        finally:
+            self.waiting -= 1
+            self._record_wait(wait_started)
+
+        if not acquired:
+            self.rejected_timeout += 1
+            raise AdmissionRejected("Kuyrukta bekleme süresi doldu", self._estimate_retry_after())
+
+        self.active += 1
+        self.admitted_total += 1
+        service_started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._record_service(service_started)
+            self._semaphore.release()
+
+    def snapshot(self) -> Dict:
+        """Kuyruk derinliği ve bekleme süresi istatistikleri"""
+        avg_wait = self._total_wait_seconds / self._wait_count if self._wait_count else 0.0
+        return {
+            "max_concurrent": self.max_concurrent,
+            "max_queue": self.max_queue,
+            "queue_timeout": self.queue_timeout,
+            "active": self.active,
+            "queue_depth": self.waiting,
+            "admitted_total": self.admitted_total,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "last_wait_seconds": round(self.last_wait_seconds, 3),
+            "avg_wait_seconds": round(avg_wait, 3),
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+            "avg_service_seconds": round(self._avg_service_seconds, 3),
+        }
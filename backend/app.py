@@ -1,13 +1,28 @@
 import os
-from fastapi import FastAPI, HTTPException, UploadFile, File
+import re
+import sys
+import time
+import threading
+from collections import OrderedDict
+from typing import Optional
+import chromadb
+from chromadb.config import Settings
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from rag_system import RAGSystem
 import uvicorn
 
+# api/ altındaki ortak yardımcı modüller (Vercel fonksiyonu ile paylaşılır)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "api"))
+
+from rag_system import RAGSystem
+from admission import AdmissionController, AdmissionRejected
+from _request_log import RequestLogger
+
 # Environment variables yükle
 load_dotenv()
 
@@ -31,33 +46,141 @@ app.add_middleware(
 # Frontend dosyalarını servis et
 app.mount("/static", StaticFiles(directory="../frontend"), name="static")
 
-# RAG sistemi
-rag_system = None
+# Kılavuz (manual) başına bir RAG sistemi; ilk kullanımda yüklenir, LRU ile boşaltılır
+DEFAULT_MANUAL = os.getenv("DEFAULT_MANUAL", "user_guide")
+MAX_LOADED_MANUALS = int(os.getenv("MAX_LOADED_MANUALS", 3))
+MANUAL_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_-]{1,61}[A-Za-z0-9]$")
+MANUAL_CACHE_SECONDS = float(os.getenv("MANUAL_CACHE_SECONDS", 10))
+
+rag_systems = OrderedDict()
+_rag_systems_lock = threading.Lock()
+_loading_locks = {}
+openai_api_key = None
+
+# Var olan kılavuzlar (ChromaDB koleksiyonları), kısa süre önbelleklenir
+_chroma_client = None
+_known_manuals = set()
+_known_manuals_checked_at = float("-inf")
+_known_manuals_lock = threading.Lock()
+
+# LLM çağrıları için admission control (eşzamanlılık + bekleme kuyruğu)
+admission = AdmissionController(
+    max_concurrent=int(os.getenv("MAX_CONCURRENT_LLM", 4)),
+    max_queue=int(os.getenv("MAX_QUEUE_DEPTH", 16)),
+    queue_timeout=float(os.getenv("QUEUE_TIMEOUT", 10))
+)
+
+# Soru logları (scripts/build_faq.py için), arka planda yazılır
+request_logger = RequestLogger(os.getenv("REQUEST_LOG_DIR", "../logs"), source="backend")
 
 
 class QuestionRequest(BaseModel):
     question: str
+    manual: Optional[str] = None
 
 
 class AnswerResponse(BaseModel):
     answer: str
     sources: list
+    degraded: bool = False
+
+
+def manual_exists(manual: str) -> bool:
+    """Kılavuzun bilgi tabanı (ChromaDB koleksiyonu) var mı
+
+    Koleksiyon listesi MANUAL_CACHE_SECONDS boyunca önbelleklenir; böylece bilinmeyen adlar
+    her istekte RAGSystem oluşturmaz ve paylaşılan indeks dizini açmaz.
+    """
+    global _chroma_client, _known_manuals, _known_manuals_checked_at
+
+    if manual in _known_manuals:
+        return True
+
+    with _known_manuals_lock:
+        if manual in _known_manuals:
+            return True
+        if time.monotonic() - _known_manuals_checked_at < MANUAL_CACHE_SECONDS:
+            return False
+
+        if _chroma_client is None:
+            _chroma_client = chromadb.PersistentClient(
+                path="./chroma_db",
+                settings=Settings(anonymized_telemetry=False)
+            )
+        # chromadb < 0.6 Collection nesneleri, sonrası isimler döndürür
+        _known_manuals = {getattr(c, "name", c) for c in _chroma_client.list_collections()}
+        _known_manuals_checked_at = time.monotonic()
+        return manual in _known_manuals
+
+
+def _cached_rag_system(manual: str) -> Optional[RAGSystem]:
+    with _rag_systems_lock:
+        rag = rag_systems.get(manual)
+        if rag is not None:
+            rag_systems.move_to_end(manual)
+        return rag
+
+
+def get_rag_system(manual: str = None, create: bool = False) -> Optional[RAGSystem]:
+    """Kılavuzun RAG sistemini döndür; yüklü değilse yükle, gerekirse en eskisini boşalt
+
+    create=False iken bilgi tabanı oluşturulmamış kılavuzlar için None döner.
+    """
+    manual = manual or DEFAULT_MANUAL
+
+    rag = _cached_rag_system(manual)
+    if rag is not None:
+        return rag
+
+    if not openai_api_key:
+        return None
+    if not create and not manual_exists(manual):
+        return None
+
+    # Yükleme (ChromaDB I/O, paylaşılan indeks yayını) global kilidin dışında, kılavuz başına
+    # kilitle yapılır; diğer kılavuzların önbellek isabetleri beklemez
+    with _rag_systems_lock:
+        load_lock = _loading_locks.setdefault(manual, threading.Lock())
+
+    with load_lock:
+        rag = _cached_rag_system(manual)
+        if rag is not None:
+            return rag
+
+        shared_index_dir = os.getenv("SHARED_INDEX_DIR")
+        rag = RAGSystem(
+            openai_api_key=openai_api_key,
+            collection_name=manual,
+            shared_index_dir=os.path.join(shared_index_dir, manual) if shared_index_dir else None,
+            request_budget=float(os.getenv("REQUEST_BUDGET_SECONDS", 30)),
+            embedding_timeout=float(os.getenv("EMBEDDING_TIMEOUT", 5)),
+            completion_timeout=float(os.getenv("COMPLETION_TIMEOUT", 25))
+        )
+
+        if not rag.load_collection() and not create:
+            return None
+
+        with _rag_systems_lock:
+            rag_systems[manual] = rag
+            while len(rag_systems) > MAX_LOADED_MANUALS:
+                evicted, _ = rag_systems.popitem(last=False)
+                print(f"ℹ Kılavuz bellekten çıkarıldı (LRU): {evicted}")
+
+    return rag
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Uygulama başlangıcında RAG sistemini yükle"""
-    global rag_system
+    """Uygulama başlangıcında varsayılan kılavuzun RAG sistemini yükle"""
+    global openai_api_key
 
     openai_api_key = os.getenv("OPENAI_API_KEY")
     if not openai_api_key:
         print("UYARI: OPENAI_API_KEY bulunamadı!")
         return
 
-    rag_system = RAGSystem(openai_api_key=openai_api_key)
-
-    # Eğer bilgi tabanı varsa yükle
-    if rag_system.load_collection():
+    # Eğer bilgi tabanı varsa yükle (diğer kılavuzlar ilk istekte yüklenir)
+    if get_rag_system(DEFAULT_MANUAL):
         print("✓ Bilgi tabanı yüklendi")
     else:
         print("ℹ Bilgi tabanı henüz oluşturulmamış. /initialize endpoint'ini kullanın.")
@@ -74,20 +197,23 @@ async def health_check():
     """Sağlık kontrolü"""
     return {
         "status": "healthy",
-        "rag_initialized": rag_system is not None and rag_system.collection is not None
+        "rag_initialized": any(rag.is_ready() for rag in list(rag_systems.values()))
     }
 
 
 @app.post("/initialize")
-async def initialize_knowledge_base(pdf_file: UploadFile = File(...)):
-    """PDF yükleyerek bilgi tabanını oluştur"""
-    global rag_system
+async def initialize_knowledge_base(pdf_file: UploadFile = File(...), manual: str = Form(None)):
+    """PDF yükleyerek bilgi tabanını oluştur (manual verilmezse varsayılan kılavuz)"""
+    manual = manual or DEFAULT_MANUAL
+    if not MANUAL_NAME_PATTERN.match(manual):
+        raise HTTPException(status_code=400, detail=f"Geçersiz kılavuz adı: {manual}")
 
+    rag_system = get_rag_system(manual, create=True)
     if not rag_system:
         raise HTTPException(status_code=500, detail="RAG sistemi başlatılamadı")
 
     # PDF'i kaydet
-    pdf_path = "../data/user_guide.pdf"
+    pdf_path = f"../data/{manual}.pdf"
     with open(pdf_path, "wb") as f:
         content = await pdf_file.read()
         f.write(content)
@@ -102,9 +228,11 @@ async def initialize_knowledge_base(pdf_file: UploadFile = File(...)):
             chunk_size=chunk_size,
             chunk_overlap=chunk_overlap
         )
+        _known_manuals.add(manual)
 
         return {
             "status": "success",
+            "manual": manual,
             "message": "Bilgi tabanı başarıyla oluşturuldu"
         }
     except Exception as e:
@@ -114,45 +242,75 @@ async def initialize_knowledge_base(pdf_file: UploadFile = File(...)):
 @app.post("/ask", response_model=AnswerResponse)
 async def ask_question(request: QuestionRequest):
     """Soru sor ve cevap al"""
-    if not rag_system or not rag_system.collection:
+    manual = request.manual or DEFAULT_MANUAL
+    if not MANUAL_NAME_PATTERN.match(manual):
+        raise HTTPException(status_code=400, detail=f"Geçersiz kılavuz adı: {manual}")
+
+    # İlk kullanımda yükleme (ChromaDB I/O) event loop'u bloklamasın
+    rag_system = await run_in_threadpool(get_rag_system, manual)
+    if not rag_system or not rag_system.is_ready():
         raise HTTPException(
             status_code=400,
-            detail="Bilgi tabanı henüz yüklenmemiş. Lütfen önce PDF yükleyin."
+            detail=f"'{manual}' bilgi tabanı henüz yüklenmemiş. Lütfen önce PDF yükleyin."
         )
 
-    try:
-        max_tokens = int(os.getenv("MAX_TOKENS", 500))
-        temperature = float(os.getenv("TEMPERATURE", 0.7))
+    max_tokens = int(os.getenv("MAX_TOKENS", 500))
+    temperature = float(os.getenv("TEMPERATURE", 0.7))
+    started = time.monotonic()
 
-        result = rag_system.generate_answer(
-            question=request.question,
-            max_tokens=max_tokens,
-            temperature=temperature
+    try:
+        async with admission.slot():
+            try:
+                # Senkron OpenAI çağrısı event loop'u bloklamasın
+                result = await run_in_threadpool(
+                    rag_system.generate_answer,
+                    question=request.question,
+                    max_tokens=max_tokens,
+                    temperature=temperature
+                )
+            except Exception as e:
+                raise HTTPException(status_code=500, detail=f"Cevap üretilemedi: {str(e)}")
+    except AdmissionRejected as e:
+        request_logger.log(request.question, tier="rejected", shard=manual)
+        raise HTTPException(
+            status_code=429,
+            detail=f"Sistem şu anda yoğun ({e.reason}). Lütfen {e.retry_after} saniye sonra tekrar deneyin.",
+            headers={"Retry-After": str(e.retry_after)}
         )
 
-        return AnswerResponse(
-            answer=result["answer"],
-            sources=result["sources"]
-        )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Cevap üretilemedi: {str(e)}")
+    request_logger.log(
+        request.question,
+        tier="degraded" if result.get("degraded") else "rag",
+        shard=manual,
+        latency_ms=round((time.monotonic() - started) * 1000)
+    )
+
+    return AnswerResponse(
+        answer=result["answer"],
+        sources=result["sources"],
+        degraded=result.get("degraded", False)
+    )
 
 
 @app.get("/status")
 async def get_status():
     """Sistem durumunu kontrol et"""
-    if not rag_system:
+    if not openai_api_key:
         return {"initialized": False, "message": "RAG sistemi başlatılmamış"}
 
-    has_collection = rag_system.collection is not None
-
-    if has_collection:
-        count = rag_system.collection.count()
-        return {
+    rag_system = await run_in_threadpool(get_rag_system, DEFAULT_MANUAL)
+    if rag_system and rag_system.is_ready():
+        count = rag_system.count()
+        status = {
             "initialized": True,
             "chunks_count": count,
+            "default_manual": DEFAULT_MANUAL,
+            "loaded_manuals": list(rag_systems),
             "message": f"Sistem hazır. {count} parça yüklenmiş."
         }
+        if rag_system.shared_index:
+            status["shared_index_generation"] = rag_system.shared_index.generation
+        return status
     else:
         return {
             "initialized": False,
@@ -160,6 +318,15 @@ async def get_status():
         }
 
 
+@app.get("/metrics")
+async def get_metrics():
+    """Admission control kuyruk derinliği ve bekleme süreleri"""
+    return {
+        "admission": admission.snapshot(),
+        "request_log": {"enabled": request_logger.enabled, "dropped": request_logger.dropped}
+    }
+
+
 if __name__ == "__main__":
     uvicorn.run(
         "app:app",
@@ -1,20 +1,36 @@
 import os
+import json
 from typing import List, Dict
 import chromadb
 from chromadb.config import Settings
 from langchain_openai import OpenAIEmbeddings
 from openai import OpenAI
 from pdf_processor import PDFProcessor
+from shared_index import SharedIndex
+from _dedup import dedupe_chunks
+from _lexical import BM25Index, reciprocal_rank_fusion
+from _resilience import (
+    Deadline, LatencyTracker, RetryBudget, hedged_call, call_with_retries, degraded_answer
+)
 
 
 class RAGSystem:
     """Retrieval-Augmented Generation sistemi"""
 
-    def __init__(self, openai_api_key: str, collection_name: str = "user_guide"):
+    def __init__(self, openai_api_key: str, collection_name: str = "user_guide", shared_index_dir: str = None,
+                 request_budget: float = 30.0, embedding_timeout: float = 5.0, completion_timeout: float = 25.0):
         self.openai_api_key = openai_api_key
-        self.client = OpenAI(api_key=openai_api_key)
+        # SDK'nın kendi retry'ları kapalı; tekrar denemeler retry bütçesinden yapılır
+        self.client = OpenAI(api_key=openai_api_key, timeout=completion_timeout, max_retries=0)
         self.embeddings = OpenAIEmbeddings(openai_api_key=openai_api_key)
 
+        # Deadline / hedge / retry bütçesi ayarları
+        self.request_budget = request_budget
+        self.embedding_timeout = embedding_timeout
+        self.completion_timeout = completion_timeout
+        self.embedding_latency = LatencyTracker(default=1.0)
+        self.retry_budget = RetryBudget()
+
         # ChromaDB kurulumu
         self.chroma_client = chromadb.PersistentClient(
             path="./chroma_db",
@@ -24,6 +40,14 @@ class RAGSystem:
         self.collection_name = collection_name
         self.collection = None
 
+        # Çok worker'lı kurulumlar için salt okunur paylaşılan indeks (opsiyonel)
+        self.shared_index = SharedIndex(shared_index_dir) if shared_index_dir else None
+
+        # Hibrit arama için BM25 index (doc id -> lexical_documents sırası)
+        # Paylaşılan indeks modunda BM25 her neslin içinde yayınlanır, burada tutulmaz
+        self.lexical_index = None
+        self.lexical_documents = []
+
     def initialize_knowledge_base(self, pdf_path: str, chunk_size: int = 1000, chunk_overlap: int = 200):
         """PDF'den bilgi tabanını oluştur"""
         # Önce var olan collection'ı sil
@@ -43,20 +67,41 @@ class RAGSystem:
         processor = PDFProcessor(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
         chunks = processor.process_pdf(pdf_path)
 
+        # Örtüşen parçalardan neredeyse aynı olanları embedding'den önce birleştir
+        deduped, stats = dedupe_chunks([{"text": chunk} for chunk in chunks])
+        chunks = [chunk["text"] for chunk in deduped]
+        print(f"Tekrar eden parçalar birleştirildi: {stats['before']} → {stats['after']}")
+
         # Embeddings oluştur ve kaydet
         print("Embeddings oluşturuluyor...")
+        all_embeddings = []
         for idx, chunk in enumerate(chunks):
             embedding = self.embeddings.embed_query(chunk)
+            all_embeddings.append(embedding)
             self.collection.add(
                 embeddings=[embedding],
                 documents=[chunk],
                 ids=[f"chunk_{idx}"]
             )
 
+        # Diğer worker'lar yeni nesli (BM25 postings dahil) bir sonraki sorguda görür
+        if self.shared_index and chunks:
+            with self.shared_index.lock():
+                self.shared_index.publish(all_embeddings, chunks)
+            self.shared_index.attach()
+            # ChromaDB moduna dönülürse eski dosya yerine koleksiyondan yeniden oluşturulsun
+            if os.path.exists(self._lexical_index_path()):
+                os.remove(self._lexical_index_path())
+        else:
+            self.build_lexical_index(chunks, save=True)
+
         print(f"✓ Bilgi tabanı hazır! {len(chunks)} parça yüklendi.")
 
     def load_collection(self):
         """Var olan collection'ı yükle"""
+        if self.shared_index:
+            return self.load_shared_index()
+
         try:
             self.collection = self.chroma_client.get_collection(name=self.collection_name)
             return True
@@ -64,25 +109,149 @@ class RAGSystem:
             print(f"Collection yüklenemedi: {e}")
             return False
 
-    def search_relevant_chunks(self, query: str, n_results: int = 3) -> List[str]:
+    def load_shared_index(self):
+        """Paylaşılan indekse bağlan; henüz yayınlanmamışsa ChromaDB'den yayınla"""
+        if self.shared_index.attach():
+            return True
+
+        # Kilidi alan ilk worker yayınlar, diğerleri hazır nesle bağlanır
+        with self.shared_index.lock():
+            if self.shared_index.attach():
+                return True
+
+            try:
+                collection = self.chroma_client.get_collection(name=self.collection_name)
+                data = collection.get(include=["embeddings", "documents"])
+            except Exception as e:
+                print(f"Collection yüklenemedi: {e}")
+                return False
+
+            if not data["documents"]:
+                return False
+
+            self.shared_index.publish(data["embeddings"], data["documents"])
+
+        return self.shared_index.attach()
+
+    def is_ready(self) -> bool:
+        """Sorgulanabilir bir bilgi tabanı var mı"""
+        if self.shared_index:
+            # İlk yayından önce başlamış worker'lar başka bir worker'ın /initialize'ını burada yakalar
+            return self.shared_index.is_attached or self.shared_index.attach()
+        return self.collection is not None
+
+    def count(self) -> int:
+        """Yüklü parça sayısı"""
+        if self.shared_index and self.shared_index.is_attached:
+            # Boştaki worker da başka bir worker'ın yayınladığı yeni nesli raporlasın
+            self.shared_index.refresh()
+            return self.shared_index.count()
+        return self.collection.count() if self.collection else 0
+
+    def _lexical_index_path(self) -> str:
+        return os.path.join("./chroma_db", f"{self.collection_name}_lexical.json")
+
+    def build_lexical_index(self, documents: List[str], save: bool = False):
+        """BM25 index'i oluştur; istenirse ChromaDB'nin yanına kaydet"""
+        self.lexical_documents = list(documents)
+        self.lexical_index = BM25Index.build(self.lexical_documents)
+
+        if save:
+            with open(self._lexical_index_path(), "w", encoding="utf-8") as f:
+                json.dump({"documents": self.lexical_documents, "index": self.lexical_index.to_dict()},
+                          f, ensure_ascii=False)
+
+    def load_lexical_index(self):
+        """BM25 index'i yükle; yoksa ChromaDB koleksiyonundaki dokümanlardan oluştur"""
+        if self.lexical_index is not None:
+            return
+
+        try:
+            with open(self._lexical_index_path(), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if not BM25Index.is_current(data["index"]):
+                raise ValueError("Lexical index eski tokenizer ile oluşturulmuş")
+            self.lexical_documents = data["documents"]
+            self.lexical_index = BM25Index.from_dict(data["index"])
+        except (FileNotFoundError, KeyError, ValueError):
+            if self.collection:
+                documents = self.collection.get(include=["documents"])["documents"]
+                self.build_lexical_index(documents, save=True)
+
+    def embed_query(self, query: str, deadline: Deadline) -> List[float]:
+        """Sorgu embedding'i; p95 süresinde dönmezse hedge edilir"""
+        timeout = deadline.stage(max_seconds=self.embedding_timeout, reserve=5)
+
+        def call(call_timeout):
+            # Koleksiyondaki vektörlerle aynı model
+            response = self.client.with_options(timeout=call_timeout).embeddings.create(
+                model=self.embeddings.model,
+                input=query
+            )
+            return response.data[0].embedding
+
+        return hedged_call(call, timeout, self.embedding_latency, self.retry_budget)
+
+    def search_relevant_chunks(self, query: str, n_results: int = 3, deadline: Deadline = None) -> List[str]:
         """Sorguya en uygun parçaları bul"""
-        if not self.collection:
+        if not self.is_ready():
             if not self.load_collection():
                 return []
 
-        query_embedding = self.embeddings.embed_query(query)
+        candidates = max(10, n_results)
 
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
-        )
+        # Lexical arama yerel, ağ çağrısı yok
+        view = None
+        if self.shared_index:
+            # Sorgu boyunca tek bir nesil görünümü; RRF anahtarı doc id, metinler mmap'ten okunur
+            self.shared_index.refresh()
+            view = self.shared_index.current
+            lexical_ranking = view.lexical_search(query, top_k=candidates)
+        else:
+            # ChromaDB modunda RRF anahtarı doküman metni
+            self.load_lexical_index()
+            lexical_ranking = []
+            if self.lexical_index is not None:
+                lexical_ranking = [
+                    self.lexical_documents[doc_id]
+                    for doc_id, _ in self.lexical_index.search(query, top_k=candidates)
+                ]
+
+        # Embedding API yavaş veya erişilemezse lexical sonuçlarla devam et
+        try:
+            query_embedding = self.embed_query(query, deadline or Deadline(self.request_budget))
+        except Exception as e:
+            if not lexical_ranking:
+                raise
+            print(f"Embedding alınamadı, sadece lexical arama kullanılıyor: {e}")
+            query_embedding = None
+
+        vector_ranking = []
+        if query_embedding is not None and view is not None:
+            vector_ranking = view.search(query_embedding, n_results=candidates)
+        elif query_embedding is not None:
+            results = self.collection.query(
+                query_embeddings=[query_embedding],
+                n_results=candidates
+            )
+            vector_ranking = results['documents'][0] if results['documents'] else []
 
-        return results['documents'][0] if results['documents'] else []
+        fused = [key for key, _ in reciprocal_rank_fusion([vector_ranking, lexical_ranking])[:n_results]]
+        if view is not None:
+            return [view.get_document(doc_id) for doc_id in fused]
+        return fused
 
     def generate_answer(self, question: str, max_tokens: int = 500, temperature: float = 0.7) -> Dict:
         """Soruya cevap üret"""
+        deadline = Deadline(self.request_budget)
+
         # İlgili dokuman parçalarını bul
-        relevant_chunks = self.search_relevant_chunks(question, n_results=3)
+        try:
+            relevant_chunks = self.search_relevant_chunks(question, n_results=3, deadline=deadline)
+        except Exception as e:
+            # Deadline, SDK timeout'u veya API hatası (lexical sonuç da yoksa)
+            print(f"Arama başarısız: {e}")
+            return degraded_answer([])
 
         if not relevant_chunks:
             return {
@@ -109,15 +278,26 @@ Kullanıcı Sorusu: {question}
 Lütfen yukarıdaki kullanıcı klavuzu bilgilerine dayanarak soruyu cevapla."""
 
         # OpenAI API çağrısı
-        response = self.client.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt}
-            ],
-            max_tokens=max_tokens,
-            temperature=temperature
-        )
+        def complete(call_timeout):
+            return self.client.with_options(timeout=call_timeout).chat.completions.create(
+                model="gpt-4",
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                max_tokens=max_tokens,
+                temperature=temperature
+            )
+
+        try:
+            response = call_with_retries(
+                complete, deadline, self.retry_budget,
+                max_seconds=self.completion_timeout, min_seconds=2
+            )
+        except Exception as e:
+            # Bütçe doldu veya LLM cevap vermedi: bulunan kaynakları yine de döndür
+            print(f"Cevap üretilemedi, kaynaklar döndürülüyor: {e}")
+            return degraded_answer(relevant_chunks)
 
         answer = response.choices[0].message.content
 
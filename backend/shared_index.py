@@ -0,0 +1,277 @@
+import fcntl
+import json
+import os
+import shutil
+from contextlib import contextmanager
+from typing import List, Optional
+
+import numpy as np
+
+from _lexical import BM25Index
+
+
+CURRENT_FILE = "CURRENT"
+LOCK_FILE = ".lock"
+KEEP_GENERATIONS = 2
+
+
+class SharedIndex:
+    """Worker'lar arasında paylaşılan, salt okunur bilgi tabanı indeksi
+
+    Bir süreç embedding matrisini, chunk metinlerini ve BM25 postings'ini `index_dir` altına
+    mmap'lenebilir dosyalar olarak yayınlar. Diğer tüm worker'lar bu dosyalara
+    kopyalamadan bağlanır; işletim sistemi sayfaları tek kopya olarak paylaşır.
+    `CURRENT` dosyasındaki nesil (generation) sayacı değiştiğinde worker'lar
+    bir sonraki sorguda yeni indekse geçer.
+
+    Dizin yapısı:
+        CURRENT              -> aktif nesil numarası
+        gen_<N>/embeddings.npy  (float32, normalize edilmiş)
+        gen_<N>/offsets.npy     (int64, len = chunk sayısı + 1)
+        gen_<N>/texts.bin       (UTF-8 metinler art arda)
+        gen_<N>/lexical*        (BM25: sıralı terimler, postings, idf, doküman uzunlukları)
+    """
+
+    def __init__(self, index_dir: str):
+        self.index_dir = index_dir
+        self.current: Optional[IndexGeneration] = None
+        self._current_mtime = None
+
+    # ---------- Yayınlama ----------
+
+    @contextmanager
+    def lock(self):
+        """Aynı anda tek bir sürecin yayın yapmasını sağlayan dosya kilidi"""
+        os.makedirs(self.index_dir, exist_ok=True)
+        with open(os.path.join(self.index_dir, LOCK_FILE), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def publish(self, embeddings: List[List[float]], documents: List[str]) -> int:
+        """Yeni bir nesil yayınla ve numarasını döndür
+
+        Çağıran taraf `lock()` içinde olmalıdır.
+        """
+        if not documents or len(embeddings) != len(documents):
+            raise ValueError("Embedding ve doküman sayıları eşleşmiyor veya boş")
+
+        generation = self.read_generation() + 1
+        gen_dir = self._generation_dir(generation)
+        tmp_dir = gen_dir + ".tmp"
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        os.makedirs(tmp_dir)
+
+        # Cosine similarity tek bir matris çarpımı olsun diye normalize et
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        np.save(os.path.join(tmp_dir, "embeddings.npy"), matrix / norms)
+
+        encoded = [doc.encode("utf-8") for doc in documents]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(b) for b in encoded])
+        np.save(os.path.join(tmp_dir, "offsets.npy"), offsets)
+        with open(os.path.join(tmp_dir, "texts.bin"), "wb") as f:
+            for b in encoded:
+                f.write(b)
+
+        _write_lexical(tmp_dir, BM25Index.build(documents))
+
+        shutil.rmtree(gen_dir, ignore_errors=True)
+        os.rename(tmp_dir, gen_dir)
+
+        # CURRENT dosyasını atomik olarak değiştir
+        current_tmp = os.path.join(self.index_dir, CURRENT_FILE + ".tmp")
+        with open(current_tmp, "w") as f:
+            f.write(str(generation))
+        os.replace(current_tmp, os.path.join(self.index_dir, CURRENT_FILE))
+
+        self._remove_old_generations(generation)
+        print(f"✓ Paylaşılan indeks yayınlandı: nesil {generation}, {len(documents)} parça")
+        return generation
+
+    def _remove_old_generations(self, current: int):
+        """Eski nesilleri sil (hâlâ bağlı worker'lar için bir önceki tutulur)"""
+        for name in os.listdir(self.index_dir):
+            if not name.startswith("gen_") or name.endswith(".tmp"):
+                continue
+            try:
+                generation = int(name[len("gen_"):])
+            except ValueError:
+                continue
+            # Linux'ta mmap'li dosyalar silinse de açık eşlemeler geçerli kalır
+            if generation <= current - KEEP_GENERATIONS:
+                shutil.rmtree(os.path.join(self.index_dir, name), ignore_errors=True)
+
+    # ---------- Bağlanma ----------
+
+    def _generation_dir(self, generation: int) -> str:
+        return os.path.join(self.index_dir, f"gen_{generation}")
+
+    def read_generation(self) -> int:
+        """Aktif nesil numarası (yayın yoksa 0)"""
+        try:
+            with open(os.path.join(self.index_dir, CURRENT_FILE)) as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def attach(self) -> bool:
+        """Aktif nesle kopyalamadan (mmap) bağlan"""
+        try:
+            self._current_mtime = os.stat(os.path.join(self.index_dir, CURRENT_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return False
+
+        generation = self.read_generation()
+        if generation == 0:
+            return False
+        if generation == self.generation:
+            return True
+
+        try:
+            view = IndexGeneration(generation, self._generation_dir(generation))
+        except (FileNotFoundError, ValueError) as e:
+            print(f"Paylaşılan indeks yüklenemedi (nesil {generation}): {e}")
+            return False
+
+        self.current = view
+        print(f"✓ Paylaşılan indekse bağlanıldı: nesil {generation}, {view.count()} parça")
+        return True
+
+    def refresh(self):
+        """CURRENT değiştiyse yeni nesle geç"""
+        try:
+            mtime = os.stat(os.path.join(self.index_dir, CURRENT_FILE)).st_mtime_ns
+        except FileNotFoundError:
+            return
+        if mtime != self._current_mtime:
+            self.attach()
+
+    @property
+    def generation(self) -> int:
+        return self.current.generation if self.current else 0
+
+    @property
+    def is_attached(self) -> bool:
+        return self.current is not None
+
+    def count(self) -> int:
+        return self.current.count() if self.current else 0
+
+
+class IndexGeneration:
+    """Yayınlanmış tek bir nesle salt okunur (mmap) görünüm
+
+    Bir sorgu boyunca aynı görünüm kullanılır; sorgu sırasında yeni nesle geçilse bile
+    doc id'ler, embedding'ler ve metinler birbiriyle tutarlı kalır.
+    """
+
+    def __init__(self, generation: int, gen_dir: str):
+        self.generation = generation
+        self.embeddings = np.load(os.path.join(gen_dir, "embeddings.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(gen_dir, "offsets.npy"), mmap_mode="r")
+        self.texts = np.memmap(os.path.join(gen_dir, "texts.bin"), dtype=np.uint8, mode="r")
+        self.lexical_index = _load_lexical(gen_dir)
+
+    def count(self) -> int:
+        return len(self.offsets) - 1
+
+    def get_document(self, idx: int) -> str:
+        start, end = int(self.offsets[idx]), int(self.offsets[idx + 1])
+        return bytes(self.texts[start:end]).decode("utf-8")
+
+    def search(self, query_embedding: List[float], n_results: int = 3) -> List[int]:
+        """Cosine similarity ile en yakın parçaların doc id'leri"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0 or not self.count():
+            return []
+
+        scores = self.embeddings @ (query / norm)
+        n_results = min(n_results, len(scores))
+        top = np.argpartition(-scores, n_results - 1)[:n_results]
+        top = top[np.argsort(-scores[top])]
+        return [int(idx) for idx in top]
+
+    def lexical_search(self, query: str, top_k: int = 10) -> List[int]:
+        """BM25 ile en uygun parçaların doc id'leri (index yoksa boş)"""
+        if self.lexical_index is None:
+            return []
+        return [int(doc_id) for doc_id, _ in self.lexical_index.search(query, top_k=top_k)]
+
+
+class _TermTable:
+    """Sıralı terim dizisi üzerinde ikili arama ile term -> değer eşlemesi
+
+    Terimler ve değerler mmap'li dizilerde kalır; worker başına dict kopyası oluşmaz.
+    """
+
+    def __init__(self, terms: np.ndarray, value):
+        self._terms = terms
+        self._value = value
+
+    def _find(self, term: str) -> Optional[int]:
+        idx = int(np.searchsorted(self._terms, term))
+        if idx < len(self._terms) and self._terms[idx] == term:
+            return idx
+        return None
+
+    def get(self, term: str, default=None):
+        idx = self._find(term)
+        return default if idx is None else self._value(idx)
+
+    def __getitem__(self, term: str):
+        idx = self._find(term)
+        if idx is None:
+            raise KeyError(term)
+        return self._value(idx)
+
+
+def _write_lexical(gen_dir: str, index: BM25Index):
+    """BM25 index'i mmap'lenebilir dizilere yaz (terimler sıralı, postings tek düz dizi)"""
+    terms = sorted(index.postings)
+    term_offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+    term_offsets[1:] = np.cumsum([len(index.postings[term]) for term in terms])
+    postings = np.asarray(
+        [posting for term in terms for posting in index.postings[term]], dtype=np.int32
+    ).reshape(-1, 2)
+
+    np.save(os.path.join(gen_dir, "lexical_terms.npy"), np.asarray(terms, dtype=str))
+    np.save(os.path.join(gen_dir, "lexical_term_offsets.npy"), term_offsets)
+    np.save(os.path.join(gen_dir, "lexical_postings.npy"), postings)
+    np.save(os.path.join(gen_dir, "lexical_idf.npy"), np.asarray([index.idf[t] for t in terms], dtype=np.float64))
+    np.save(os.path.join(gen_dir, "lexical_doc_lengths.npy"), np.asarray(index.doc_lengths, dtype=np.int32))
+
+    meta = {key: value for key, value in index.to_dict().items() if key not in ("postings", "doc_lengths")}
+    with open(os.path.join(gen_dir, "lexical.json"), "w") as f:
+        json.dump(meta, f)
+
+
+def _load_lexical(gen_dir: str) -> Optional[BM25Index]:
+    """Nesildeki BM25 dizilerine mmap ile bağlan (eski veya eksikse None)"""
+    try:
+        with open(os.path.join(gen_dir, "lexical.json")) as f:
+            meta = json.load(f)
+    except FileNotFoundError:
+        print("ℹ Bu nesilde lexical index yok; sadece vektör arama kullanılacak")
+        return None
+    if not BM25Index.is_current(meta):
+        print("ℹ Bu nesildeki lexical index eski tokenizer ile oluşturulmuş; sadece vektör arama kullanılacak")
+        return None
+
+    def load(name):
+        return np.load(os.path.join(gen_dir, f"lexical_{name}.npy"), mmap_mode="r")
+
+    terms, term_offsets, postings, idf = load("terms"), load("term_offsets"), load("postings"), load("idf")
+    return BM25Index(
+        _TermTable(terms, lambda i: postings[term_offsets[i]:term_offsets[i + 1]]),
+        load("doc_lengths"),
+        k1=meta["k1"],
+        b=meta["b"],
+        stem_prefix=meta["stem_prefix"],
+        idf=_TermTable(terms, lambda i: float(idf[i]))
+    )
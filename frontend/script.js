@@ -96,7 +96,8 @@ function addMessage(text, sender, sources = null) {
         sourcesHTML = '<div class="sources"><div class="sources-title">📚 İlgili Kaynak Bölümler:</div>';
         sources.forEach((source, index) => {
             const text = typeof source === 'string' ? source : source.text;
-            const page = source.page ? ` (Sayfa ${source.page})` : '';
+            const pages = (source.pages || [source.page]).filter(Boolean);
+            const page = pages.length ? ` (Sayfa ${pages.join(', ')})` : '';
             const preview = text.substring(0, 150) + (text.length > 150 ? '...' : '');
             sourcesHTML += `<div class="source-item">${preview}${page}</div>`;
         });
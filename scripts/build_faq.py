@@ -0,0 +1,227 @@
+"""
+İstek loglarından sık sorulan soruları (SSS) çıkarıp cevaplarını önceden üreten script
+Loglanan soruların embedding'leri kümelenir, en sık niyetler için mevcut knowledge base'e
+karşı cevap üretilir ve data/faq_answers.json dosyasına KB sürümüyle birlikte kaydedilir
+Argüman olarak log dizinleri (local backend) veya dışa aktarılmış Vercel runtime log dosyaları verilebilir
+Local backend kayıtlarındaki kılavuz adı ChromaDB koleksiyon adıdır (ör. user_guide); manifest'te
+olmayan adlar varsayılan kılavuza sayılır, diğerleri --manual ile bu kılavuza eşlenebilir
+"""
+
+import os
+import sys
+import json
+import argparse
+from collections import Counter
+from datetime import datetime, timezone
+from typing import List, Dict, Tuple
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "api"))
+
+import chat  # noqa: E402
+from _faq import normalize_question, build_faq_data  # noqa: E402
+from _lexical import code_tokens  # noqa: E402
+from _request_log import iter_logged_questions  # noqa: E402
+from _shards import register_shard  # noqa: E402
+
+TOP_INTENTS = int(os.getenv("FAQ_TOP_INTENTS", 50))
+MIN_COUNT = int(os.getenv("FAQ_MIN_COUNT", 3))
+CLUSTER_THRESHOLD = float(os.getenv("FAQ_CLUSTER_THRESHOLD", 0.9))
+EMBEDDING_BATCH_SIZE = 100
+
+
+def collect_questions(log_paths: List[str], shard_name: str, is_default: bool,
+                      known_shards: List[str], aliases: List[str] = ()) -> Tuple[Counter, Dict]:
+    """Loglardaki soruları normalize edip say; her normalize soru için ilk orijinal metni tut"""
+    counts = Counter()
+    originals = {}
+
+    for log_path in log_paths:
+        if not os.path.exists(log_path):
+            print(f"⚠️  Log bulunamadı, atlanıyor: {log_path}")
+            continue
+        for record in iter_logged_questions(log_path):
+            # Shard bilgisi olmayan eski kayıtlar ve manifest'te olmayan adlar (backend koleksiyonları)
+            # varsayılan kılavuza aittir; --manual ile verilen adlar bu kılavuza eşlenir
+            record_shard = record.get("shard")
+            if record_shard == shard_name or record_shard in aliases:
+                pass
+            elif not (is_default and (record_shard is None or record_shard not in known_shards)):
+                continue
+            normalized = normalize_question(record["question"])
+            if not normalized:
+                continue
+            counts[normalized] += 1
+            originals.setdefault(normalized, record["question"].strip())
+
+    return counts, originals
+
+
+def embed_questions(questions: List[str]) -> np.ndarray:
+    """Soruları toplu halde embedding'e çevir (normalize edilmiş)"""
+    client = chat.get_openai_client()
+    vectors = []
+
+    for i in range(0, len(questions), EMBEDDING_BATCH_SIZE):
+        batch = questions[i:i + EMBEDDING_BATCH_SIZE]
+        print(f"  {i + len(batch)}/{len(questions)}", end='\r')
+        response = client.embeddings.create(model="text-embedding-3-small", input=batch)
+        vectors.extend(item.embedding for item in response.data)
+
+    matrix = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def cluster_questions(questions: List[str], counts: Counter, matrix: np.ndarray, originals: Dict) -> List[Dict]:
+    """Sıklık sırasına göre lider kümeleme: her soru en yakın uygun lidere katılır ya da yeni küme açar
+
+    Üyeler SSS'de birebir varyant olarak sunulduğu için bir soru, embedding benzerliğine ek olarak
+    kod benzeri kelimeleri (Z/X raporu, hata kodları) liderinkiyle aynıysa kümeye katılır.
+    """
+    order = sorted(range(len(questions)), key=lambda i: counts[questions[i]], reverse=True)
+    leaders = []
+    clusters = []
+
+    for idx in order:
+        codes = code_tokens(originals[questions[idx]])
+        joined = False
+        if leaders:
+            sims = matrix[leaders] @ matrix[idx]
+            for best in np.argsort(-sims):
+                if sims[best] < CLUSTER_THRESHOLD:
+                    break
+                if clusters[best]["codes"] == codes:
+                    clusters[best]["members"].append(questions[idx])
+                    clusters[best]["count"] += counts[questions[idx]]
+                    joined = True
+                    break
+        if joined:
+            continue
+
+        leaders.append(idx)
+        clusters.append({
+            "leader": questions[idx],
+            "members": [questions[idx]],
+            "count": counts[questions[idx]],
+            "codes": codes
+        })
+
+    clusters.sort(key=lambda c: c["count"], reverse=True)
+    return clusters
+
+
+def generate_faq_entries(clusters: List[Dict], originals: Dict, shard_name: str) -> List[Dict]:
+    """En sık niyetler için mevcut knowledge base'e karşı cevap üret"""
+    entries = []
+
+    for i, cluster in enumerate(clusters, 1):
+        question = originals[cluster["leader"]]
+        print(f"⚙️  {i}/{len(clusters)}: {question}")
+
+        result = chat.generate_answer(question, shard_name=shard_name)
+        if not result["sources"] or result.get("degraded"):
+            print("⚠️  Cevap üretilemedi, atlanıyor")
+            continue
+
+        entries.append({
+            "question": question,
+            # Orijinal yazımıyla: FAQTable büyük harfli kodları buna göre ayırt eder
+            "variants": [originals[member] for member in cluster["members"]],
+            "count": cluster["count"],
+            "answer": result["answer"],
+            "sources": result["sources"]
+        })
+
+    return entries
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="İstek loglarından SSS cevap tablosu oluştur")
+    parser.add_argument("log_paths", nargs="*", help="Log dizinleri veya dışa aktarılmış Vercel log dosyaları")
+    parser.add_argument("--shard", default=os.getenv("KB_SHARD"), help="Manifest'teki kılavuz adı (varsayılan: KB_SHARD veya manifest varsayılanı)")
+    parser.add_argument("--manual", action="append", default=[],
+                        help="Bu kılavuza sayılacak log adı (ör. backend koleksiyonu); birden fazla verilebilir")
+    return parser.parse_args()
+
+
+def main():
+    print("=" * 60)
+    print("  SSS (FAQ) Cevap Tablosu Oluşturma")
+    print("=" * 60)
+    print()
+
+    args = parse_args()
+    log_paths = args.log_paths or [os.getenv("REQUEST_LOG_DIR", os.path.join(BASE_DIR, "logs"))]
+
+    registry = chat.get_shard_registry()
+    shard_name = args.shard or registry.default
+    if shard_name not in registry.names():
+        print(f"❌ Kılavuz bulunamadı: {shard_name} (mevcut: {', '.join(registry.names())})")
+        return
+    print(f"📚 Kılavuz: {shard_name}")
+
+    # 1. Logları oku
+    print("\n📋 Adım 1: İstek Loglarını Okuma")
+    print("-" * 60)
+    counts, originals = collect_questions(
+        log_paths, shard_name, shard_name == registry.default, registry.names(), aliases=args.manual
+    )
+    if not counts:
+        print(f"❌ Log bulunamadı: {', '.join(log_paths)}")
+        return
+    print(f"✓ {sum(counts.values())} istek, {len(counts)} farklı soru")
+
+    kb_version = chat.get_knowledge_base_version(shard_name)
+    if not kb_version:
+        print("❌ Knowledge base yüklenemedi")
+        return
+
+    # 2. Embedding + kümeleme
+    print("\n📋 Adım 2: Soruları Kümeleme")
+    print("-" * 60)
+    questions = list(counts)
+    matrix = embed_questions(questions)
+    clusters = cluster_questions(questions, counts, matrix, originals)
+    top_clusters = [c for c in clusters if c["count"] >= MIN_COUNT][:TOP_INTENTS]
+    print(f"\n✓ {len(clusters)} niyet bulundu, {len(top_clusters)} tanesi SSS'ye alınacak")
+
+    # 3. Cevapları üret
+    print("\n📋 Adım 3: Cevapları Üretme")
+    print("-" * 60)
+    entries = generate_faq_entries(top_clusters, originals, shard_name)
+
+    # 4. Kaydet (shard'ın manifest'teki FAQ dosyası)
+    data_dir = os.path.join(BASE_DIR, "data")
+    shard_info = registry.manifest["shards"][shard_name]
+    faq_file = shard_info.get("faq") or os.path.join(os.path.dirname(shard_info["file"]), f"{shard_name}_faq.json")
+    if shard_info.get("faq") != faq_file:
+        register_shard(data_dir, shard_name, shard_info["file"], faq=faq_file)
+    output_path = os.path.join(data_dir, faq_file)
+    covered = sum(e["count"] for e in entries)
+    faq_data = build_faq_data(
+        entries,
+        kb_version,
+        created_at=datetime.now(timezone.utc).isoformat(),
+        total_requests=sum(counts.values()),
+        covered_requests=covered
+    )
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(faq_data, f, ensure_ascii=False, indent=2)
+
+    print("\n" + "=" * 60)
+    print("✅ İşlem Tamamlandı!")
+    print("=" * 60)
+    print(f"  • {len(entries)} SSS kaydı → {output_path}")
+    print(f"  • Trafiğin %{100 * covered / sum(counts.values()):.1f}'i önceden hesaplanmış cevaplarla karşılanabilir")
+    print(f"  • KB sürümü: {kb_version}")
+
+
+if __name__ == "__main__":
+    main()
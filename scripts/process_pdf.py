@@ -4,9 +4,11 @@ Bu script sadece bir kere çalıştırılır ve knowledge_base.json dosyası olu
 """
 
 import os
+import sys
 import json
+import argparse
 import base64
-from typing import List, Dict
+from typing import List, Dict, Tuple
 from pypdf import PdfReader
 from pdf2image import convert_from_path
 from openai import OpenAI
@@ -15,6 +17,15 @@ import tiktoken
 
 load_dotenv()
 
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "api"))
+
+from _dedup import dedupe_chunks, collapse_by_embedding, retrieval_overlap  # noqa: E402
+from _lexical import BM25Index  # noqa: E402
+from _shards import register_shard  # noqa: E402
+
+DEDUP_EMBEDDING_THRESHOLD = float(os.getenv("DEDUP_EMBEDDING_THRESHOLD", 0.97))
+
 client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 
 
@@ -169,6 +180,7 @@ def create_embeddings(chunks: List[Dict]) -> List[Dict]:
             enriched_chunks.append({
                 "text": chunk["text"],
                 "page_number": chunk["page_number"],
+                "page_numbers": chunk.get("page_numbers", [chunk["page_number"]]),
                 "chunk_index": chunk["chunk_index"],
                 "embedding": embedding,
                 "token_count": count_tokens(chunk["text"])
@@ -182,7 +194,63 @@ def create_embeddings(chunks: List[Dict]) -> List[Dict]:
     return enriched_chunks
 
 
-def save_knowledge_base(chunks: List[Dict], output_path: str):
+def remove_duplicate_chunks(chunks: List[Dict]) -> Tuple[List[Dict], Dict]:
+    """Örtüşen pencereler ve tekrar eden metinden oluşan neredeyse aynı chunk'ları birleştir (MinHash aşaması)"""
+    deduped, stats = dedupe_chunks(chunks)
+
+    # chunk_index sıralı kalsın
+    for idx, chunk in enumerate(deduped):
+        chunk["chunk_index"] = idx
+
+    removed = stats["before"] - stats["after"]
+    print(f"✓ {stats['before']} → {stats['after']} parça ({removed} tekrar birleştirildi: "
+          f"{stats['exact_pairs']} birebir, {stats['near_pairs']} benzer, {stats['contained_pairs']} kapsanan)")
+    return deduped, stats
+
+
+def collapse_similar_embeddings(chunks: List[Dict]) -> Tuple[List[Dict], Dict]:
+    """Embedding'i neredeyse aynı chunk'ları birleştir (embedding aşaması)
+
+    Küçülme ve top-3 kapsamı sadece bu aşamanın girdisine göredir; orijinal chunk setine
+    göre rapor için --report ile report_dedup() kullanılır.
+    """
+    collapsed, stats = collapse_by_embedding(chunks, threshold=DEDUP_EMBEDDING_THRESHOLD)
+
+    for idx, chunk in enumerate(collapsed):
+        chunk["chunk_index"] = idx
+
+    dims = len(chunks[0]["embedding"]) if chunks else 0
+    size_before = len(chunks) * dims * 4 / 1024
+    size_after = len(collapsed) * dims * 4 / 1024
+    overlap = retrieval_overlap(chunks, collapsed) if len(collapsed) < len(chunks) else 1.0
+
+    print(f"✓ Embedding benzerliği ≥ {DEDUP_EMBEDDING_THRESHOLD}: {stats['before']} → {stats['after']} parça")
+    print(f"   Vektör index boyutu: {size_before:.0f} KB → {size_after:.0f} KB")
+    print(f"   Top-3 sayfa kapsamı (bu aşamanın girdisine göre): %{overlap * 100:.1f}")
+
+    stats["retrieval_page_overlap"] = round(overlap, 4)
+    return collapsed, stats
+
+
+def report_dedup(original: List[Dict], final: List[Dict]) -> Dict:
+    """Her iki aşamanın toplam etkisi: orijinal chunk setine göre index küçülmesi ve top-3 sayfa kapsamı"""
+    dims = len(original[0]["embedding"]) if original else 0
+    size_before = len(original) * dims * 4 / 1024
+    size_after = len(final) * dims * 4 / 1024
+    overlap = retrieval_overlap(original, final) if len(final) < len(original) else 1.0
+
+    print(f"\n📊 Dedupe raporu (orijinal {len(original)} parçaya göre): {len(original)} → {len(final)} parça")
+    print(f"   Vektör index boyutu: {size_before:.0f} KB → {size_after:.0f} KB")
+    print(f"   Top-3 sayfa kapsamı: %{overlap * 100:.1f}")
+
+    return {
+        "index_kb_before": round(size_before, 1),
+        "index_kb_after": round(size_after, 1),
+        "retrieval_page_overlap": round(overlap, 4)
+    }
+
+
+def save_knowledge_base(chunks: List[Dict], output_path: str, dedup_stats: Dict = None):
     """Knowledge base'i JSON olarak kaydet"""
     knowledge_base = {
         "metadata": {
@@ -191,8 +259,12 @@ def save_knowledge_base(chunks: List[Dict], output_path: str):
             "embedding_model": "text-embedding-3-small",
             "vision_model": "gpt-4o"
         },
-        "chunks": chunks
+        "chunks": chunks,
+        # Hibrit arama için BM25 inverted index (chunk sırasıyla aynı doc id'ler)
+        "lexical_index": BM25Index.build([c["text"] for c in chunks]).to_dict()
     }
+    if dedup_stats:
+        knowledge_base["metadata"]["dedup"] = dedup_stats
 
     with open(output_path, 'w', encoding='utf-8') as f:
         json.dump(knowledge_base, f, ensure_ascii=False, indent=2)
@@ -202,7 +274,23 @@ def save_knowledge_base(chunks: List[Dict], output_path: str):
     print(f"   Dosya boyutu: {file_size:.2f} MB")
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="PDF'den knowledge base (shard) oluştur")
+    parser.add_argument("pdf_path", nargs="?", default="../data/Manuel utilisateur.docx.pdf")
+    parser.add_argument("--shard", help="Kılavuz adı; verilirse data/shards/<ad>.json oluşturulur ve manifest'e eklenir")
+    parser.add_argument("--device", help="Cihaz modeli (istek yönlendirme için)")
+    parser.add_argument("--language", help="Kılavuz dili (ör. fr, tr)")
+    parser.add_argument("--version", help="Kılavuz sürümü")
+    parser.add_argument("--title", help="Kılavuz başlığı")
+    parser.add_argument("--default", action="store_true", help="Bu kılavuzu varsayılan yap")
+    parser.add_argument("--report", action="store_true",
+                        help="Dedupe öncesi tüm parçaları embed edip küçülme ve arama kalitesini orijinal sete göre raporla")
+    return parser.parse_args()
+
+
 def main():
+    args = parse_args()
+
     print("=" * 60)
     print("  PDF İşleme ve Knowledge Base Oluşturma")
     print("  GPT-4 Vision ile Görsel Analizi Dahil")
@@ -210,7 +298,7 @@ def main():
     print()
 
     # PDF yolu
-    pdf_path = "../data/Manuel utilisateur.docx.pdf"
+    pdf_path = args.pdf_path
 
     if not os.path.exists(pdf_path):
         print(f"❌ PDF bulunamadı: {pdf_path}")
@@ -227,17 +315,51 @@ def main():
     print("-" * 60)
     chunks = create_chunks(pages_data)
     print(f"✓ {len(chunks)} parça oluşturuldu")
+    original_count = len(chunks)
 
-    # 3. Embeddings oluştur
-    print("\n📋 Adım 3: Embeddings Oluşturma")
+    # 3. Dedupe + embeddings
+    print("\n📋 Adım 3: Tekrar Temizleme ve Embeddings")
     print("-" * 60)
-    enriched_chunks = create_embeddings(chunks)
+    if args.report:
+        # Rapor için orijinal set embed edilir; MinHash'te tutulan chunk embedding'ini korur
+        original_chunks = create_embeddings(chunks)
+        chunks, minhash_stats = remove_duplicate_chunks(original_chunks)
+        enriched_chunks = chunks
+    else:
+        chunks, minhash_stats = remove_duplicate_chunks(chunks)
+        enriched_chunks = create_embeddings(chunks)
+    enriched_chunks, embedding_stats = collapse_similar_embeddings(enriched_chunks)
+
+    dedup_stats = {
+        "original_chunks": original_count,
+        "final_chunks": len(enriched_chunks),
+        "minhash": minhash_stats,
+        "embedding": embedding_stats
+    }
+    if args.report:
+        dedup_stats["report"] = report_dedup(original_chunks, enriched_chunks)
 
     # 4. Kaydet
     print("\n📋 Adım 4: Knowledge Base Kaydetme")
     print("-" * 60)
-    output_path = "../data/knowledge_base.json"
-    save_knowledge_base(enriched_chunks, output_path)
+    if args.shard:
+        shard_file = f"shards/{args.shard}.json"
+        os.makedirs("../data/shards", exist_ok=True)
+        output_path = os.path.join("../data", shard_file)
+    else:
+        output_path = "../data/knowledge_base.json"
+    save_knowledge_base(enriched_chunks, output_path, dedup_stats)
+
+    if args.shard:
+        register_shard(
+            "../data", args.shard, shard_file,
+            make_default=args.default,
+            device=args.device,
+            language=args.language,
+            version=args.version,
+            title=args.title
+        )
+        print(f"✓ Manifest güncellendi: {args.shard}")
 
     print("\n" + "=" * 60)
     print("✅ İşlem Tamamlandı!")